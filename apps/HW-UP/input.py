@@ -0,0 +1,1458 @@
+#!/usr/bin/env python3
+
+# Input module shared by the apps. Edit common/input.py and run
+# scripts/sync_common.py; the copies in the app folders are generated.
+
+import struct
+import os
+import json
+import select
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Tuple, Callable, List, Any, Dict
+
+class InputDiscovery:
+    """Maps input device names to their /dev/input/eventN nodes.
+
+    The event nodes are numbered in probe order, so the devices are looked up
+    by the driver name in sysfs (rotary@0, gpio_keys, hyn_ts). /sys/class/input
+    is scanned once; after watch(), an inotify watch on /dev/input keeps the
+    mapping current and read_event() reports the changes:
+        ('device_added', name, path), ('device_removed', name, path)
+    """
+
+    IN_ATTRIB = 0x004
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    INOTIFY_EVENT = struct.Struct('iIII')
+
+    def __init__(self, input_root='/sys/class/input', dev_dir='/dev/input'):
+        self.input_root = input_root
+        self.dev_dir = dev_dir
+        self._paths = None
+        self._fd = None
+        self._events = deque()
+
+    def _name_of(self, node: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.input_root, node, 'device', 'name'), 'r', encoding='utf-8') as f:
+                return f.readline().strip() or None
+        except OSError:
+            return None
+
+    def scan(self) -> Dict[str, str]:
+        """Rescan sysfs; returns {name: device path}."""
+        paths = {}
+        try:
+            nodes = sorted(os.listdir(self.input_root))
+        except OSError:
+            nodes = []
+        for node in nodes:
+            if not node.startswith('event'):
+                continue
+            name = self._name_of(node)
+            # Keep the first node if two devices share a name
+            if name and name not in paths:
+                paths[name] = os.path.join(self.dev_dir, node)
+        self._paths = paths
+        return dict(paths)
+
+    def find(self, name: str) -> Optional[str]:
+        if self._paths is None:
+            self.scan()
+        return self._paths.get(name)
+
+    def watch(self) -> bool:
+        """Start following /dev/input with inotify; False if it is not available."""
+        if self._fd is not None:
+            return True
+        try:
+            import ctypes
+
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                return False
+            mask = self.IN_CREATE | self.IN_DELETE | self.IN_ATTRIB | self.IN_MOVED_TO | self.IN_MOVED_FROM
+            if libc.inotify_add_watch(fd, self.dev_dir.encode(), mask) < 0:
+                os.close(fd)
+                return False
+        except (OSError, AttributeError):
+            return False
+        if self._paths is None:
+            self.scan()
+        self._fd = fd
+        return True
+
+    def fileno(self) -> Optional[int]:
+        return self._fd
+
+    def _handle(self, mask: int, node: str):
+        path = os.path.join(self.dev_dir, node)
+        if mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+            for name, known in list(self._paths.items()):
+                if known == path:
+                    del self._paths[name]
+                    self._events.append(('device_removed', name, path))
+            return
+        # IN_CREATE, or IN_ATTRIB once udev has set the permissions
+        name = self._name_of(node)
+        if name and self._paths.get(name) != path:
+            self._paths[name] = path
+            self._events.append(('device_added', name, path))
+
+    def read_event(self, timeout: Optional[float] = None) -> Optional[Tuple[str, str, str]]:
+        if self._events:
+            return self._events.popleft()
+        if self._fd is None:
+            return None
+        if timeout is not None:
+            ready, _, _ = select.select([self._fd], [], [], timeout)
+            if not ready:
+                return None
+        try:
+            data = os.read(self._fd, 4096)
+        except BlockingIOError:
+            return None
+        offset = 0
+        while offset + self.INOTIFY_EVENT.size <= len(data):
+            _, mask, _, length = self.INOTIFY_EVENT.unpack_from(data, offset)
+            offset += self.INOTIFY_EVENT.size
+            node = data[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+            offset += length
+            if node.startswith('event'):
+                self._handle(mask, node)
+        return self._events.popleft() if self._events else None
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._events.clear()
+
+_discovery = None
+
+def get_discovery() -> InputDiscovery:
+    """The InputDiscovery shared by every device in the process."""
+    global _discovery
+    if _discovery is None:
+        _discovery = InputDiscovery()
+    return _discovery
+
+class InputDevice:
+    EVENT_FORMAT = 'llHHi'
+    EVENT_SIZE = struct.calcsize(EVENT_FORMAT)
+
+    EV_SYN = 0x00
+    EV_KEY = 0x01
+    EV_ABS = 0x03
+
+    EVIOCSCLOCKID = 0x400445a0
+    EVIOCGRAB = 0x40044590
+
+    # input_events drained per read(); a touch flood costs one syscall per batch
+    READ_BATCH = 64
+
+    # sysfs name the device is found by, and the node used if it is not listed
+    DEVICE_NAME = None
+    DEFAULT_PATH = None
+
+    def __init__(self, device_path: Optional[str] = None):
+        # None looks the device up by DEVICE_NAME when it is opened
+        self.device_path = device_path
+        self.device = None
+        self._raw_events = deque()
+        # Kernel timestamp of the last event returned by read_event, and the
+        # clock it can be compared with
+        self.event_time = 0.0
+        self.clock = time.time
+        # Exclusive access requested with grab(); kept across reopens
+        self.grabbed = False
+
+    def open(self) -> bool:
+        if self.device_path is None:
+            self.device_path = get_discovery().find(self.DEVICE_NAME) or self.DEFAULT_PATH
+        try:
+            import fcntl
+            # Unbuffered: events are read in batches by read_raw_events
+            self.device = open(self.device_path, 'rb', buffering=0)
+            flags = fcntl.fcntl(self.device, fcntl.F_GETFL)
+            fcntl.fcntl(self.device, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+            # Stamp events with CLOCK_MONOTONIC so they compare with time.monotonic()
+            try:
+                fcntl.ioctl(self.device, self.EVIOCSCLOCKID, struct.pack('i', time.CLOCK_MONOTONIC))
+                self.clock = time.monotonic
+            except OSError:
+                self.clock = time.time
+            if self.grabbed:
+                self._set_grab(True)
+            return True
+        except Exception as e:
+            print(f"Failed to open device {self.device_path}: {e}")
+            return False
+
+    def _set_grab(self, grab: bool) -> bool:
+        import fcntl
+        try:
+            fcntl.ioctl(self.device, self.EVIOCGRAB, int(grab))
+            return True
+        except OSError as e:
+            print(f"Failed to {'grab' if grab else 'release'} device {self.device_path}: {e}")
+            return False
+
+    def grab(self) -> bool:
+        """Take the events for this process only, so the NanoKVM UI does not react to them."""
+        if not self.device or not self._set_grab(True):
+            return False
+        self.grabbed = True
+        return True
+
+    def ungrab(self):
+        if self.grabbed and self.device:
+            self._set_grab(False)
+        self.grabbed = False
+
+    @contextmanager
+    def exclusive(self):
+        """with device.exclusive(): holds the grab and releases it on exit, even on errors."""
+        self.grab()
+        try:
+            yield self
+        finally:
+            self.ungrab()
+
+    def close(self):
+        if self.device:
+            self.device.close()
+            self.device = None
+        self._raw_events.clear()
+
+    def fileno(self) -> Optional[int]:
+        return self.device.fileno() if self.device else None
+
+    def read_raw_events(self) -> int:
+        # One os.read for up to READ_BATCH events, decoded with iter_unpack
+        try:
+            data = os.read(self.device.fileno(), self.READ_BATCH * self.EVENT_SIZE)
+        except BlockingIOError:
+            return 0
+        size = len(data) - len(data) % self.EVENT_SIZE
+        self._raw_events.extend(struct.iter_unpack(self.EVENT_FORMAT, memoryview(data)[:size]))
+        return size // self.EVENT_SIZE
+
+    def _next_raw_event(self) -> Optional[Tuple[int, int, int, int, int]]:
+        if not self._raw_events and not self.read_raw_events():
+            return None
+        return self._raw_events.popleft()
+
+    def _wait_readable(self, timeout: Optional[float]) -> bool:
+        # Events left over from the last batch are ready without a syscall
+        if timeout is None or self._raw_events:
+            return True
+        ready, _, _ = select.select([self.device], [], [], timeout)
+        return bool(ready)
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+class GpioKeys(InputDevice):
+    KEY_UP = 103
+    KEY_DOWN = 108
+    KEY_LEFT = 105
+    KEY_RIGHT = 106
+    KEY_ENTER = 28
+    KEY_ESC = 1
+
+    KEY_NAMES = {
+        103: 'UP',
+        108: 'DOWN',
+        105: 'LEFT',
+        106: 'RIGHT',
+        28: 'ENTER',
+        1: 'ESC',
+    }
+
+    DEVICE_NAME = 'gpio_keys'
+    DEFAULT_PATH = '/dev/input/by-path/platform-gpio_keys-event'
+
+    # _IOW/_IOR('E', 0x03, unsigned int[2]): autorepeat delay and period in ms
+    EVIOCSREP = 0x40084503
+    EVIOCGREP = 0x80084503
+    REP = struct.Struct('II')
+
+    def __init__(self, device_path=None, long_press_time: float = 2.0,
+                 repeat_delay: Optional[float] = None, repeat_period: Optional[float] = None):
+        super().__init__(device_path)
+        # Seconds a key is held before key_long_press
+        self.long_press_time = long_press_time
+        # Kernel autorepeat to set when the device opens (None keeps the current one)
+        self.repeat_delay = repeat_delay
+        self.repeat_period = repeat_period
+        self._pending_key_code = None
+        self._pending_value = 0
+        self._key_press_times = {}
+        self._long_press_triggered = {}
+        self._events = deque()
+
+    def open(self) -> bool:
+        if not super().open():
+            return False
+        if self.repeat_delay is not None or self.repeat_period is not None:
+            self.set_repeat(self.repeat_delay, self.repeat_period)
+        return True
+
+    def get_repeat(self) -> Optional[Tuple[float, float]]:
+        """The kernel autorepeat (delay, period) in seconds, or None if the device has none."""
+        if not self.device:
+            return None
+        try:
+            import fcntl
+            delay, period = self.REP.unpack(fcntl.ioctl(self.device, self.EVIOCGREP, bytes(self.REP.size)))
+        except OSError:
+            return None
+        return (delay / 1000, period / 1000)
+
+    def set_repeat(self, delay: Optional[float] = None, period: Optional[float] = None) -> bool:
+        """Sets the kernel autorepeat; it applies to every reader of the device."""
+        current = self.get_repeat()
+        if current is None:
+            return False
+        delay = current[0] if delay is None else delay
+        period = current[1] if period is None else period
+        try:
+            import fcntl
+            fcntl.ioctl(self.device, self.EVIOCSREP, self.REP.pack(round(delay * 1000), round(period * 1000)))
+            return True
+        except OSError as e:
+            print(f"Failed to set key repeat on {self.device_path}: {e}")
+            return False
+
+    def _key_name(self, key_code: int) -> str:
+        return self.KEY_NAMES.get(key_code, f'KEY_{key_code}')
+
+    def _queue(self, event: Tuple[str, str, bool, float, bool], event_time: float):
+        self._events.append((event, event_time))
+
+    def _queue_long_press(self, key_code: int, now: float):
+        # Timed from the kernel press timestamp, so a late read does not delay it
+        press_time = self._key_press_times.get(key_code)
+        if press_time is None or key_code in self._long_press_triggered:
+            return
+        if now - press_time >= self.long_press_time:
+            self._long_press_triggered[key_code] = True
+            self._queue(('key_long_press', self._key_name(key_code), True, now - press_time, True),
+                        press_time + self.long_press_time)
+
+    def _check_long_presses(self):
+        now = self.clock()
+        for key_code in list(self._key_press_times):
+            self._queue_long_press(key_code, now)
+
+    def _pop_event(self) -> Tuple[str, str, bool, float, bool]:
+        event, self.event_time = self._events.popleft()
+        return event
+
+    def _process_report(self, event_time: float):
+        key_code = self._pending_key_code
+        self._pending_key_code = None
+        name = self._key_name(key_code)
+        value = self._pending_value
+
+        if value == 1:
+            self._key_press_times[key_code] = event_time
+            self._long_press_triggered.pop(key_code, None)
+            self._queue(('key_press', name, True, 0.0, False), event_time)
+            return
+
+        press_time = self._key_press_times.get(key_code)
+        duration = event_time - press_time if press_time is not None else 0.0
+        # A long press that was due before this report comes first
+        self._queue_long_press(key_code, event_time)
+        is_long_press = key_code in self._long_press_triggered
+
+        if value == 2:
+            self._queue(('key_repeat', name, True, duration, is_long_press), event_time)
+        else:
+            self._key_press_times.pop(key_code, None)
+            self._long_press_triggered.pop(key_code, None)
+            self._queue(('key_release', name, False, duration, is_long_press), event_time)
+
+    def _read_reports(self):
+        while True:
+            raw = self._next_raw_event()
+            if raw is None:
+                return
+
+            sec, usec, ev_type, code, value = raw
+
+            if ev_type == self.EV_KEY and value in (0, 1, 2):
+                self._pending_key_code = code
+                self._pending_value = value
+            elif ev_type == self.EV_SYN and self._pending_key_code is not None:
+                self._process_report(sec + usec / 1e6)
+
+    def read_event(self, timeout: float = 0) -> Optional[Tuple[str, str, bool, float, bool]]:
+        """Returns (event_type, key_name, pressed, duration, is_long_press).
+
+        event_type is key_press, key_repeat (kernel autorepeat while held),
+        key_long_press (once, long_press_time after the press) or key_release.
+        """
+        if not self.device:
+            return None
+
+        try:
+            # Reports already read or waiting come before the timer: a release
+            # still in the buffer must not turn a short press into a long one
+            if not self._events:
+                self._read_reports()
+            if not self._events:
+                self._check_long_presses()
+
+            if not self._events:
+                # Wake up for a long press that falls due while waiting
+                due = self.next_timeout()
+                if due is not None and timeout is not None:
+                    timeout = min(timeout, due)
+                if self._wait_readable(timeout):
+                    self._read_reports()
+                if not self._events:
+                    self._check_long_presses()
+
+            return self._pop_event() if self._events else None
+
+        except BlockingIOError:
+            return None
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            print(f"Read event error: {e}")
+            return None
+
+    def next_timeout(self) -> Optional[float]:
+        # Seconds until a held key becomes a long press; InputHub wakes for it
+        if self._events:
+            return 0.0
+        now = self.clock()
+        waits = [self.long_press_time - (now - press_time)
+                 for key_code, press_time in self._key_press_times.items()
+                 if key_code not in self._long_press_triggered]
+        return max(0.0, min(waits)) if waits else None
+
+    def wait_for_key(self, timeout: Optional[float] = None) -> Optional[str]:
+        start_time = time.time() if timeout is not None else None
+
+        while True:
+            event = self.read_event(timeout=0.1)
+            if event and event[0] == 'key_press':
+                return event[1]
+
+            if start_time is not None and time.time() - start_time > timeout:
+                return None
+
+class TouchContact:
+    """One type-B multitouch slot; tracking_id is -1 while the slot is empty."""
+
+    __slots__ = ('slot', 'tracking_id', 'x', 'y', 'active', 'changed')
+
+    def __init__(self, slot: int):
+        self.slot = slot
+        self.tracking_id = -1
+        self.x = 0
+        self.y = 0
+        # State last reported in a frame, and whether the slot changed since
+        self.active = False
+        self.changed = False
+
+class TouchScreen(InputDevice):
+    ABS_X = 0x00
+    ABS_Y = 0x01
+    ABS_MT_SLOT = 0x2f
+    ABS_MT_POSITION_X = 0x35
+    ABS_MT_POSITION_Y = 0x36
+    ABS_MT_TRACKING_ID = 0x39
+    BTN_TOUCH = 0x14a
+
+    # Slots tracked; contacts in higher slots are ignored
+    MAX_CONTACTS = 5
+
+    DEVICE_NAME = 'hyn_ts'
+    DEFAULT_PATH = '/dev/input/by-path/platform-4857000.i2c-event'
+
+    def __init__(self, device_path=None, logical_width=320, logical_height=172,
+                 coalesce_moves=False, multitouch=False):
+        super().__init__(device_path)
+        self.logical_width = logical_width
+        self.logical_height = logical_height
+        # Collapse queued touch_moves into the latest position; down/up are kept
+        self.coalesce_moves = coalesce_moves
+        # Also report ('contact_down'|'contact_up', slot, x, y) and, after each
+        # report that changed a contact, ('touch_frame', ((slot, x, y), ...))
+        self.multitouch = multitouch
+        self.contacts = [TouchContact(slot) for slot in range(self.MAX_CONTACTS)]
+        self._slot = 0
+        # The contact that current_x/current_y follow (the first one down)
+        self._primary = 0
+        self._contacts_changed = False
+        # Length of the move-only report at the end of the queue, for coalescing
+        self._tail_moves = 0
+
+        self.current_x = 0
+        self.current_y = 0
+        self.is_touching = False
+        self.touch_start_x = 0
+        self.touch_start_y = 0
+
+        self._pending_touch_down = False
+        self._pending_touch_up = False
+        self._event_queue = deque()
+        self._event_times = deque()
+
+    @staticmethod
+    def map_coords_270(touch_x: int, touch_y: int,
+                      logical_width: int = 320,
+                      logical_height: int = 172) -> Tuple[int, int]:
+        screen_x = max(0, min(logical_width - 1, logical_width - 1 - touch_y))
+        screen_y = max(0, min(logical_height - 1, touch_x))
+        return screen_x, screen_y
+
+    def _process_event(self, ev_type: int, code: int, value: int):
+        if ev_type == self.EV_ABS:
+            if code == self.ABS_X:
+                self.current_x = value
+            elif code == self.ABS_Y:
+                self.current_y = value
+            elif code == self.ABS_MT_SLOT:
+                self._slot = value if 0 <= value < self.MAX_CONTACTS else -1
+            elif code in (self.ABS_MT_POSITION_X, self.ABS_MT_POSITION_Y, self.ABS_MT_TRACKING_ID):
+                if self._slot < 0:
+                    return
+                contact = self.contacts[self._slot]
+                if code == self.ABS_MT_TRACKING_ID:
+                    contact.tracking_id = value
+                elif code == self.ABS_MT_POSITION_X:
+                    contact.x = value
+                    if self._slot == self._primary:
+                        self.current_x = value
+                else:
+                    contact.y = value
+                    if self._slot == self._primary:
+                        self.current_y = value
+                contact.changed = True
+                self._contacts_changed = True
+        elif ev_type == self.EV_KEY and code == self.BTN_TOUCH:
+            if value == 1:
+                self.is_touching = True
+                self._pending_touch_down = True
+                self._pending_touch_up = False
+            elif value == 0:
+                self.is_touching = False
+                self._pending_touch_down = False
+                self._pending_touch_up = True
+
+    def _update_primary(self):
+        # When the followed finger lifts, follow the next one still down
+        if self.contacts[self._primary].tracking_id >= 0:
+            return
+        for contact in self.contacts:
+            if contact.tracking_id >= 0:
+                self._primary = contact.slot
+                self.current_x = contact.x
+                self.current_y = contact.y
+                return
+
+    def _get_synchronized_event(self, event_time: float = 0.0) -> Optional[Tuple[str, int, int, bool]]:
+        if self._contacts_changed:
+            self._update_primary()
+        events = []
+        moves_only = True
+
+        if self._pending_touch_down:
+            self._pending_touch_down = False
+            moves_only = False
+            self.touch_start_x = self.current_x
+            self.touch_start_y = self.current_y
+            events.append(('touch_down', self.current_x, self.current_y, True))
+
+        elif self._pending_touch_up:
+            self._pending_touch_up = False
+            moves_only = False
+            events.append(('touch_up', self.current_x, self.current_y, False))
+
+        elif self.is_touching:
+            events.append(('touch_move', self.current_x, self.current_y, True))
+
+        if self._contacts_changed:
+            self._contacts_changed = False
+            frame = []
+            for contact in self.contacts:
+                if contact.changed:
+                    contact.changed = False
+                    active = contact.tracking_id >= 0
+                    if active != contact.active:
+                        contact.active = active
+                        moves_only = False
+                        if self.multitouch:
+                            kind = 'contact_down' if active else 'contact_up'
+                            events.append((kind, contact.slot, contact.x, contact.y))
+                if contact.active:
+                    frame.append((contact.slot, contact.x, contact.y))
+            if self.multitouch:
+                events.append(('touch_frame', tuple(frame)))
+
+        count = len(events)
+        queue = self._event_queue
+        if (self.coalesce_moves and moves_only and count and self._tail_moves == count
+                and len(queue) >= count
+                and all(queue[i - count][0] == events[i][0] for i in range(count))):
+            # Replace the previous move-only report, still waiting at the end
+            for i in range(count):
+                queue[i - count] = events[i]
+                self._event_times[i - count] = event_time
+        else:
+            queue.extend(events)
+            self._event_times.extend([event_time] * count)
+        self._tail_moves = count if moves_only else 0
+
+    def _pop_event(self) -> Tuple[str, int, int, bool]:
+        self.event_time = self._event_times.popleft()
+        return self._event_queue.popleft()
+
+    def read_event(self, timeout: float = 0) -> Optional[Tuple[str, int, int, bool]]:
+        if not self.device:
+            return None
+
+        try:
+            if self._event_queue:
+                return self._pop_event()
+
+            if not self._wait_readable(timeout):
+                return None
+
+            while True:
+                raw = self._next_raw_event()
+                if raw is None:
+                    break
+
+                sec, usec, ev_type, code, value = raw
+
+                if ev_type == self.EV_SYN:
+                    self._get_synchronized_event(sec + usec / 1e6)
+                else:
+                    self._process_event(ev_type, code, value)
+
+            if self._event_queue:
+                return self._pop_event()
+
+            return None
+
+        except BlockingIOError:
+            return None
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            print(f"Read event error: {e}")
+            return None
+
+    def read_all_events(self, callback: Optional[Callable] = None):
+        while True:
+            event = self.read_event(timeout=0.1)
+            if event and callback:
+                callback(*event)
+
+    def wait_for_touch(self, timeout: Optional[float] = None) -> Optional[Tuple[int, int]]:
+        start_time = time.time() if timeout is not None else None
+
+        while True:
+            event = self.read_event(timeout=0.1)
+            if event and event[0] == 'touch_down':
+                return (event[1], event[2])
+
+            if start_time is not None and time.time() - start_time > timeout:
+                return None
+
+    def is_in_rect(self, x: int, y: int, x1: int, y1: int, x2: int, y2: int) -> bool:
+        return x1 <= x <= x2 and y1 <= y <= y2
+
+class TouchMapper:
+    """Maps raw touch coordinates to logical screen pixels for a framebuffer rotation.
+
+    The panel's ABS range, an optional calibration and the rotation are folded
+    into one affine transform with 16.16 fixed-point integer coefficients, so
+    map() costs two multiply-adds per axis. rotation has the same meaning as
+    Framebuffer.rotation; TouchMapper(rotation=270) matches map_coords_270.
+
+    The calibration is a 2x3 matrix (a, b, c, d, e, f) applied to the panel
+    position in pixels: x' = a*x + b*y + c, y' = d*x + e*y + f. calibrate()
+    fits it to touched points and save_calibration() stores it for all apps.
+    """
+
+    # _IOR('E', 0x40 + axis, struct input_absinfo)
+    EVIOCGABS = 0x80184540
+    ABSINFO = struct.Struct('6i')
+    IDENTITY = (1.0, 0.0, 0.0, 0.0, 1.0, 0.0)
+    CALIBRATION_FILE = '/etc/kvm/touch_calibration.json'
+    SHIFT = 16
+
+    def __init__(self, rotation: int = 270, panel_width: int = 172, panel_height: int = 320,
+                 x_range: Optional[Tuple[int, int]] = None, y_range: Optional[Tuple[int, int]] = None,
+                 calibration: Optional[Tuple[float, ...]] = None):
+        if rotation not in (0, 90, 180, 270):
+            raise ValueError(f"rotation must be 0, 90, 180 or 270, not {rotation}")
+        self.rotation = rotation
+        self.panel_width = panel_width
+        self.panel_height = panel_height
+        self.x_range = x_range or (0, panel_width - 1)
+        self.y_range = y_range or (0, panel_height - 1)
+        self.calibration = tuple(calibration or self.IDENTITY)
+        if rotation in (90, 270):
+            self.width, self.height = panel_height, panel_width
+        else:
+            self.width, self.height = panel_width, panel_height
+        self._build()
+
+    @classmethod
+    def for_device(cls, touch: 'TouchScreen', rotation: int = 270,
+                   calibration_file: Optional[str] = CALIBRATION_FILE, **kwargs) -> 'TouchMapper':
+        """Uses the ABS ranges the driver reports and the saved calibration, if any."""
+        x_range = cls.read_abs_range(touch, TouchScreen.ABS_MT_POSITION_X) or cls.read_abs_range(touch, TouchScreen.ABS_X)
+        y_range = cls.read_abs_range(touch, TouchScreen.ABS_MT_POSITION_Y) or cls.read_abs_range(touch, TouchScreen.ABS_Y)
+        calibration = cls.load_calibration(calibration_file) if calibration_file else None
+        return cls(rotation, x_range=x_range, y_range=y_range, calibration=calibration, **kwargs)
+
+    @classmethod
+    def read_abs_range(cls, device: InputDevice, axis: int) -> Optional[Tuple[int, int]]:
+        if not device.device:
+            return None
+        try:
+            import fcntl
+            info = fcntl.ioctl(device.device, cls.EVIOCGABS + axis, bytes(cls.ABSINFO.size))
+        except OSError:
+            return None
+        _, minimum, maximum, _, _, _ = cls.ABSINFO.unpack(info)
+        return (minimum, maximum) if maximum > minimum else None
+
+    @staticmethod
+    def _compose(outer: Tuple[float, ...], inner: Tuple[float, ...]) -> Tuple[float, ...]:
+        a, b, c, d, e, f = outer
+        g, h, i, j, k, l = inner
+        return (a * g + b * j, a * h + b * k, a * i + b * l + c,
+                d * g + e * j, d * h + e * k, d * i + e * l + f)
+
+    def _rotation_matrix(self) -> Tuple[float, ...]:
+        # Inverse of Framebuffer._rotate_rect: panel pixel -> logical pixel
+        pw, ph = self.panel_width - 1, self.panel_height - 1
+        return {
+            0: (1, 0, 0, 0, 1, 0),
+            90: (0, 1, 0, -1, 0, pw),
+            180: (-1, 0, pw, 0, -1, ph),
+            270: (0, -1, ph, 1, 0, 0),
+        }[self.rotation]
+
+    def _scale_matrix(self) -> Tuple[float, ...]:
+        (x0, x1), (y0, y1) = self.x_range, self.y_range
+        sx = (self.panel_width - 1) / (x1 - x0)
+        sy = (self.panel_height - 1) / (y1 - y0)
+        return (sx, 0.0, -x0 * sx, 0.0, sy, -y0 * sy)
+
+    def _build(self):
+        matrix = self._compose(self._rotation_matrix(), self._compose(self.calibration, self._scale_matrix()))
+        self.matrix = matrix
+        one = 1 << self.SHIFT
+        a, b, c, d, e, f = (round(v * one) for v in matrix)
+        # Rounding is folded into the constant terms
+        self._fixed = (a, b, c + one // 2, d, e, f + one // 2)
+
+    def map(self, x: int, y: int) -> Tuple[int, int]:
+        a, b, c, d, e, f = self._fixed
+        shift = self.SHIFT
+        sx = (a * x + b * y + c) >> shift
+        sy = (d * x + e * y + f) >> shift
+        return (min(max(sx, 0), self.width - 1), min(max(sy, 0), self.height - 1))
+
+    __call__ = map
+
+    def map_batch(self, points):
+        """Maps an (N, 2) array of raw points at once; returns an (N, 2) int32 array."""
+        import numpy as np
+
+        points = np.asarray(points, dtype=np.int64)
+        a, b, c, d, e, f = self._fixed
+        out = np.empty(points.shape, dtype=np.int32)
+        xs, ys = points[:, 0], points[:, 1]
+        np.clip((a * xs + b * ys + c) >> self.SHIFT, 0, self.width - 1, out=out[:, 0], casting='unsafe')
+        np.clip((d * xs + e * ys + f) >> self.SHIFT, 0, self.height - 1, out=out[:, 1], casting='unsafe')
+        return out
+
+    def calibrate(self, raw_points: List[Tuple[int, int]], screen_points: List[Tuple[int, int]]) -> Tuple[float, ...]:
+        """Fits the calibration so the raw touches land on the screen points they were aimed at.
+
+        Needs three or more points that are not on one line; returns and
+        applies the new calibration.
+        """
+        if len(raw_points) != len(screen_points) or len(raw_points) < 3:
+            raise ValueError("calibrate needs three or more pairs of points")
+        # Work in panel pixels: undo the rotation on the targets, apply the
+        # ABS scaling to the touches
+        a, b, c, d, e, f = self._rotation_matrix()
+        det = a * e - b * d
+        inverse = (e / det, -b / det, (b * f - c * e) / det, -d / det, a / det, (c * d - a * f) / det)
+        scale = self._scale_matrix()
+        sources = [self._apply(scale, x, y) for x, y in raw_points]
+        targets = [self._apply(inverse, x, y) for x, y in screen_points]
+
+        # Least squares for each output row: [x y 1] . row = target
+        ata = [[0.0] * 3 for _ in range(3)]
+        atb = [[0.0] * 3 for _ in range(2)]
+        for (x, y), target in zip(sources, targets):
+            row = (x, y, 1.0)
+            for i in range(3):
+                for j in range(3):
+                    ata[i][j] += row[i] * row[j]
+                atb[0][i] += row[i] * target[0]
+                atb[1][i] += row[i] * target[1]
+        calibration = tuple(v for rhs in atb for v in self._solve3(ata, rhs))
+        self.calibration = calibration
+        self._build()
+        return calibration
+
+    @staticmethod
+    def _apply(matrix: Tuple[float, ...], x: float, y: float) -> Tuple[float, float]:
+        a, b, c, d, e, f = matrix
+        return (a * x + b * y + c, d * x + e * y + f)
+
+    @staticmethod
+    def _solve3(m: List[List[float]], rhs: List[float]) -> Tuple[float, float, float]:
+        def det3(r):
+            return (r[0][0] * (r[1][1] * r[2][2] - r[1][2] * r[2][1])
+                    - r[0][1] * (r[1][0] * r[2][2] - r[1][2] * r[2][0])
+                    + r[0][2] * (r[1][0] * r[2][1] - r[1][1] * r[2][0]))
+
+        det = det3(m)
+        if abs(det) < 1e-9:
+            raise ValueError("calibration points must not lie on one line")
+        # Cramer's rule
+        solution = []
+        for col in range(3):
+            replaced = [[rhs[i] if j == col else m[i][j] for j in range(3)] for i in range(3)]
+            solution.append(det3(replaced) / det)
+        return tuple(solution)
+
+    @classmethod
+    def load_calibration(cls, path: str = CALIBRATION_FILE) -> Optional[Tuple[float, ...]]:
+        try:
+            with open(path, 'r') as f:
+                matrix = json.load(f)['matrix']
+            if len(matrix) == 6:
+                return tuple(float(v) for v in matrix)
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return None
+
+    def save_calibration(self, path: str = CALIBRATION_FILE):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write then rename, so a reader never sees half a file
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'matrix': list(self.calibration)}, f)
+        os.replace(path + '.tmp', path)
+
+class GestureRecognizer:
+    """Turns TouchScreen events into gestures, timed by the kernel event timestamps.
+
+    read_event() returns, in logical screen coordinates:
+        ('tap', x, y), ('double_tap', x, y), ('long_press', x, y),
+        ('drag_start', x, y), ('drag', x, y, dx, dy), ('drag_end', x, y),
+        ('swipe', direction, velocity, x, y)
+    direction is 'left', 'right', 'up' or 'down' and velocity is in pixels
+    per second. A drag ends with either drag_end or swipe. The dx, dy of its
+    drag events add up to the distance from the drag_start point.
+
+    With TouchScreen(multitouch=True), two fingers also give
+        ('pinch_start', x, y), ('pinch', scale, x, y), ('pinch_end', x, y)
+    where x, y is the point between the fingers and scale their distance
+    relative to the start of the pinch.
+    """
+
+    IDLE, PRESSED, DRAGGING, LONG_PRESSED, PINCHING, PINCHED = range(6)
+
+    __slots__ = ('touch', 'map_coords', 'tap_slop', 'long_press_time', 'double_tap_time',
+                 'swipe_distance', 'swipe_velocity', '_state', '_x0', '_y0', '_x', '_y', '_t',
+                 '_vx', '_vy', '_long_press_at', '_last_tap_t', '_last_tap_x', '_last_tap_y',
+                 '_pinch_distance', '_pending')
+
+    def __init__(self, touch: TouchScreen, map_coords: Callable = TouchScreen.map_coords_270,
+                 tap_slop: int = 8, long_press_time: float = 0.5, double_tap_time: float = 0.3,
+                 swipe_distance: int = 40, swipe_velocity: float = 300.0):
+        self.touch = touch
+        self.map_coords = map_coords
+        self.tap_slop = tap_slop
+        self.long_press_time = long_press_time
+        self.double_tap_time = double_tap_time
+        self.swipe_distance = swipe_distance
+        self.swipe_velocity = swipe_velocity
+
+        self._state = self.IDLE
+        self._x0 = self._y0 = self._x = self._y = 0
+        self._t = 0.0
+        self._vx = self._vy = 0.0
+        self._long_press_at = 0.0
+        self._last_tap_t = float('-inf')
+        self._last_tap_x = self._last_tap_y = 0
+        self._pinch_distance = 1.0
+        # A second gesture produced by one touch event, returned by the next read
+        self._pending = None
+
+    def fileno(self) -> Optional[int]:
+        return self.touch.fileno()
+
+    def next_timeout(self) -> Optional[float]:
+        # Seconds until a held touch becomes a long press; InputHub wakes for it
+        if self._state != self.PRESSED:
+            return None
+        return max(0.0, self._long_press_at - self.touch.clock())
+
+    def _long_press(self, now: float) -> Optional[Tuple]:
+        if self._state == self.PRESSED and now >= self._long_press_at:
+            self._state = self.LONG_PRESSED
+            return ('long_press', self._x0, self._y0)
+        return None
+
+    def _track(self, x: int, y: int, t: float):
+        dt = t - self._t
+        if dt > 0:
+            vx = (x - self._x) / dt
+            vy = (y - self._y) / dt
+            # Smooth over the last few reports; restart after a pause
+            if dt < 0.1:
+                vx = (self._vx + vx) / 2
+                vy = (self._vy + vy) / 2
+            self._vx, self._vy = vx, vy
+        self._x, self._y, self._t = x, y, t
+
+    def _pinch(self, frame: Tuple[Tuple[int, int, int], ...]) -> Optional[Tuple]:
+        if len(frame) < 2:
+            if self._state == self.PINCHING:
+                # The pinch is over; the finger left down makes no more gestures
+                self._state = self.PINCHED
+                return ('pinch_end', self._x, self._y)
+            return None
+
+        (_, ax, ay), (_, bx, by) = frame[0], frame[1]
+        ax, ay = self.map_coords(ax, ay)
+        bx, by = self.map_coords(bx, by)
+        distance = max(1.0, ((bx - ax) ** 2 + (by - ay) ** 2) ** 0.5)
+        self._x, self._y = (ax + bx) // 2, (ay + by) // 2
+        if self._state != self.PINCHING:
+            self._state = self.PINCHING
+            self._pinch_distance = distance
+            return ('pinch_start', self._x, self._y)
+        return ('pinch', distance / self._pinch_distance, self._x, self._y)
+
+    def feed(self, event: Tuple, t: float) -> Optional[Tuple]:
+        kind = event[0]
+        if kind == 'touch_frame':
+            return self._pinch(event[1])
+        if kind not in ('touch_down', 'touch_move', 'touch_up'):
+            return None
+
+        _, raw_x, raw_y, _ = event
+        x, y = self.map_coords(raw_x, raw_y)
+        state = self._state
+
+        if kind == 'touch_down':
+            self._state = self.PRESSED
+            self._pending = None
+            self._x0 = self._x = x
+            self._y0 = self._y = y
+            self._t = t
+            self._vx = self._vy = 0.0
+            self._long_press_at = t + self.long_press_time
+            return None
+
+        if state == self.IDLE:
+            return None
+
+        if state in (self.PINCHING, self.PINCHED):
+            if kind == 'touch_up':
+                self._state = self.IDLE
+                if state == self.PINCHING:
+                    return ('pinch_end', self._x, self._y)
+            return None
+
+        # The timestamps decide, even if the app was too busy to see the deadline
+        gesture = self._long_press(t)
+        if gesture:
+            if kind == 'touch_up':
+                self._state = self.IDLE
+            return gesture
+
+        if kind == 'touch_move':
+            last_x, last_y = self._x, self._y
+            self._track(x, y, t)
+            if state == self.PRESSED:
+                if abs(x - self._x0) > self.tap_slop or abs(y - self._y0) > self.tap_slop:
+                    self._state = self.DRAGGING
+                    # The move that starts the drag is its first step, from the touch-down point
+                    self._pending = ('drag', x, y, x - self._x0, y - self._y0)
+                    return ('drag_start', self._x0, self._y0)
+            elif state == self.DRAGGING:
+                return ('drag', x, y, x - last_x, y - last_y)
+            return None
+
+        self._state = self.IDLE
+        if state == self.PRESSED:
+            if (t - self._last_tap_t <= self.double_tap_time
+                    and abs(x - self._last_tap_x) <= 2 * self.tap_slop
+                    and abs(y - self._last_tap_y) <= 2 * self.tap_slop):
+                self._last_tap_t = float('-inf')
+                return ('double_tap', x, y)
+            self._last_tap_t = t
+            self._last_tap_x, self._last_tap_y = x, y
+            return ('tap', x, y)
+
+        if state == self.DRAGGING:
+            # The release repeats the last position, so it adds no velocity sample
+            dx = x - self._x0
+            dy = y - self._y0
+            velocity = (self._vx ** 2 + self._vy ** 2) ** 0.5
+            if max(abs(dx), abs(dy)) >= self.swipe_distance and velocity >= self.swipe_velocity:
+                if abs(dx) >= abs(dy):
+                    direction = 'right' if dx > 0 else 'left'
+                else:
+                    direction = 'down' if dy > 0 else 'up'
+                return ('swipe', direction, velocity, x, y)
+            return ('drag_end', x, y)
+
+        return None
+
+    def read_event(self, timeout: float = 0) -> Optional[Tuple]:
+        if self._pending:
+            gesture, self._pending = self._pending, None
+            return gesture
+
+        gesture = self._long_press(self.touch.clock())
+        if gesture:
+            return gesture
+
+        due = self.next_timeout()
+        if due is not None and timeout is not None:
+            timeout = min(timeout, due)
+
+        while True:
+            event = self.touch.read_event(timeout)
+            if event is None:
+                return self._long_press(self.touch.clock())
+            gesture = self.feed(event, self.touch.event_time)
+            if gesture:
+                return gesture
+            # Only the first read waits; drain the rest without blocking
+            timeout = None
+
+class RotaryEncoder(InputDevice):
+    EV_REL = 0x02
+    REL_X = 0x00
+
+    # (detents per second, steps per click), checked in order
+    ACCELERATION = ((0, 1), (12, 2), (20, 4), (30, 8))
+
+    DEVICE_NAME = 'rotary@0'
+    DEFAULT_PATH = '/dev/input/by-path/platform-rotary@0-event'
+
+    def __init__(self, device_path=None, steps_per_click=2,
+                 acceleration=None):
+        super().__init__(device_path)
+        self._accumulated = 0
+        self._steps_per_click = steps_per_click
+        self._last_event_time = 0.0
+        self._event_timeout = 0.1
+        # None reports every click as one step; RotaryEncoder.ACCELERATION
+        # or a custom curve scales the step with the spin rate
+        self.acceleration = acceleration
+        self._direction = 0
+        self._click_direction = 0
+        self._last_click_time = 0.0
+        # Clicks further apart than this start a new spin
+        self._spin_timeout = 0.25
+        # Signed detents per second of the spin, 0 for the first click of one
+        self.velocity = 0.0
+
+    def _steps(self, rate: float) -> int:
+        steps = 1
+        for min_rate, multiplier in self.acceleration or ():
+            if rate >= min_rate:
+                steps = multiplier
+        return steps
+
+    def read_event(self, timeout: float = 0) -> Optional[int]:
+        if not self.device:
+            return None
+
+        try:
+            if not self._wait_readable(timeout):
+                return None
+
+            while True:
+                raw = self._next_raw_event()
+                if raw is None:
+                    return None
+
+                sec, usec, ev_type, code, value = raw
+
+                if ev_type == self.EV_REL and code == self.REL_X:
+                    # Kernel timestamps: a late read does not stretch the intervals
+                    event_time = sec + usec / 1e6
+                    interval = event_time - self._last_event_time
+                    self._last_event_time = event_time
+                    direction = 1 if value > 0 else -1
+
+                    if interval > self._event_timeout or direction != self._direction:
+                        self._accumulated = 0
+                    self._direction = direction
+                    self._accumulated += direction
+
+                    if abs(self._accumulated) >= self._steps_per_click:
+                        self._accumulated = 0
+                        # Spin rate from the intervals between whole clicks
+                        click_interval = event_time - self._last_click_time
+                        self._last_click_time = event_time
+                        if click_interval > self._spin_timeout or direction != self._click_direction:
+                            rate = 0.0
+                        else:
+                            rate = self._steps_per_click / click_interval
+                            if self.velocity:
+                                rate = (abs(self.velocity) + rate) / 2
+                        self._click_direction = direction
+                        self.event_time = event_time
+                        self.velocity = direction * rate
+                        return direction * self._steps(rate)
+
+                elif ev_type == self.EV_SYN:
+                    continue
+
+        except BlockingIOError:
+            return None
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            print(f"Rotary encoder read error: {e}")
+            return None
+
+class InputHub:
+    """Waits on several input devices, and any other fds, with one epoll.
+
+    Events come back as (source, event) from a single wait. Sources with a
+    read_event() (InputDevices, GestureRecognizer) are drained through it;
+    other sources (a serial port, a GPIO value file, a raw fd) only report
+    readiness as (source, None).
+
+    With hotplug, InputDevices that are missing or get unplugged are reopened
+    when their node (re)appears in /dev/input; the change is also returned as
+    (hub.discovery, ('device_added' | 'device_removed', name, path)).
+    """
+
+    def __init__(self, hotplug: bool = True):
+        self._epoll = select.epoll()
+        self._sources = {}
+        self._events = deque()
+        # Sources whose device is waiting to be plugged in
+        self._unplugged = []
+        self.discovery = None
+        if hotplug and get_discovery().watch():
+            self.discovery = get_discovery()
+            self.add(self.discovery)
+
+    @staticmethod
+    def _fileno(source) -> Optional[int]:
+        if isinstance(source, int):
+            return source
+        return source.fileno()
+
+    @staticmethod
+    def _device_of(source) -> Optional[InputDevice]:
+        if isinstance(source, GestureRecognizer):
+            return source.touch
+        return source if isinstance(source, InputDevice) else None
+
+    def add(self, source) -> bool:
+        fd = self._fileno(source)
+        if fd is None:
+            device = self._device_of(source)
+            if self.discovery and device and device.DEVICE_NAME and source not in self._unplugged:
+                self._unplugged.append(source)
+            return False
+        try:
+            self._epoll.register(fd, select.EPOLLIN | select.EPOLLPRI)
+        except FileExistsError:
+            # The fd number was reused after the old source was closed
+            self._epoll.modify(fd, select.EPOLLIN | select.EPOLLPRI)
+        self._sources[fd] = source
+        return True
+
+    def remove(self, source):
+        self._events = deque(item for item in self._events if item[0] is not source)
+        if source in self._unplugged:
+            self._unplugged.remove(source)
+        for fd, registered in list(self._sources.items()):
+            if registered is source:
+                del self._sources[fd]
+                try:
+                    self._epoll.unregister(fd)
+                except (OSError, ValueError):
+                    # Already closed, which also drops it from the epoll set
+                    pass
+
+    def _wait(self, timeout: Optional[float]):
+        for source in self._sources.values():
+            next_timeout = getattr(source, 'next_timeout', None)
+            due = next_timeout() if next_timeout else None
+            if due is not None:
+                timeout = due if timeout is None else min(timeout, due)
+
+        ready = dict(self._epoll.poll(-1 if timeout is None else max(timeout, 0)))
+
+        for fd, source in list(self._sources.items()):
+            # A removed evdev node reports POLLHUP | POLLERR until it is closed
+            if ready.get(fd, 0) & (select.EPOLLHUP | select.EPOLLERR) and self._device_of(source):
+                self._unplug(fd, source)
+                continue
+            # InputDevices and wrappers such as GestureRecognizer decode events
+            if hasattr(source, 'read_event'):
+                # Also visit devices with timed events (long presses) due
+                if fd not in ready and not hasattr(source, 'next_timeout'):
+                    continue
+                while True:
+                    event = source.read_event(timeout=None)
+                    if event is None:
+                        break
+                    if source is self.discovery:
+                        self._hotplug(event)
+                    self._events.append((source, event))
+            elif fd in ready:
+                self._events.append((source, None))
+
+    def _unplug(self, fd: int, source):
+        del self._sources[fd]
+        try:
+            self._epoll.unregister(fd)
+        except (OSError, ValueError):
+            pass
+        self._device_of(source).close()
+        if self.discovery and source not in self._unplugged:
+            self._unplugged.append(source)
+
+    def _hotplug(self, event: Tuple[str, str, str]):
+        kind, name, path = event
+        if kind == 'device_removed':
+            for fd, source in list(self._sources.items()):
+                device = self._device_of(source)
+                if device and device.device_path == path:
+                    self._unplug(fd, source)
+            return
+        for source in list(self._unplugged):
+            device = self._device_of(source)
+            if device.DEVICE_NAME == name:
+                # Re-enumerated devices can come back under another eventN
+                device.device_path = path
+                if device.open():
+                    self._unplugged.remove(source)
+                    self.add(source)
+
+    def read_event(self, timeout: Optional[float] = None,
+                   deadline: Optional[float] = None) -> Optional[Tuple[Any, Any]]:
+        # deadline is a time.monotonic() value, e.g. the next timer to run
+        if self._events:
+            return self._events.popleft()
+        if timeout is not None:
+            end = time.monotonic() + timeout
+            deadline = end if deadline is None else min(deadline, end)
+        while True:
+            self._wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            if self._events:
+                return self._events.popleft()
+            # Woken without a decoded event (e.g. half a touch report); wait on
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+
+    def poll(self, timeout: Optional[float] = None,
+             deadline: Optional[float] = None) -> List[Tuple[Any, Any]]:
+        event = self.read_event(timeout, deadline)
+        if event is None:
+            return []
+        events = [event] + list(self._events)
+        self._events.clear()
+        return events
+
+    def close(self):
+        if self._epoll:
+            self._epoll.close()
+            self._epoll = None
+        self._sources = {}
+        self._unplugged = []
+        self._events.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+class AsyncInput:
+    """asyncio wrapper for opened InputDevices (or a GestureRecognizer), built on loop.add_reader.
+
+    async with AsyncInput(touch, keys) as events:
+        async for source, event in events:
+            ...
+
+    Yields the same (source, event) pairs as InputHub, without polling or
+    threads, so input can be awaited alongside serial data, subprocesses and
+    timers in one event loop.
+
+    Unplugged devices are dropped from the loop and closed. With hotplug they
+    are reopened like in InputHub, and the changes are yielded as
+    (events.discovery, ('device_added' | 'device_removed', name, path));
+    without it the removal is yielded as (source, ('device_removed', name, path)).
+    """
+
+    def __init__(self, *devices: InputDevice, hotplug: bool = True):
+        import asyncio
+
+        self.devices = devices
+        self.hotplug = hotplug
+        self.discovery = None
+        self._queue = asyncio.Queue()
+        self._loop = None
+        self._timers = {}
+        # Source -> fd of the sources with a reader in the loop
+        self._readers = {}
+        self._unplugged = []
+        # The reader fds, registered for no events: poll() reports only hang-ups
+        self._hangups = select.poll()
+
+    def start(self):
+        import asyncio
+
+        self._loop = asyncio.get_running_loop()
+        if self.hotplug and get_discovery().watch():
+            self.discovery = get_discovery()
+            self._loop.add_reader(self.discovery.fileno(), self._drain_discovery)
+        for device in self.devices:
+            self._add(device)
+
+    def _add(self, source):
+        fd = source.fileno()
+        if fd is None:
+            if self.discovery and InputHub._device_of(source).DEVICE_NAME and source not in self._unplugged:
+                self._unplugged.append(source)
+            return
+        self._readers[source] = fd
+        self._hangups.register(fd, 0)
+        self._loop.add_reader(fd, self._drain, source)
+        self._schedule(source)
+
+    def _drain(self, device: InputDevice):
+        self._timers.pop(device, None)
+        # A removed evdev node reports POLLHUP | POLLERR until it is closed, so
+        # the reader would fire forever; read_event() only prints the ENODEV
+        hung_up = {fd for fd, _ in self._hangups.poll(0)}
+        for source, fd in list(self._readers.items()):
+            if fd in hung_up:
+                self._unplug(source, report=self.discovery is None)
+        if device not in self._readers:
+            return
+        while True:
+            event = device.read_event(timeout=None)
+            if event is None:
+                break
+            self._queue.put_nowait((device, event))
+        self._schedule(device)
+
+    def _unplug(self, source, report: bool = False):
+        fd = self._readers.pop(source, None)
+        if fd is None:
+            return
+        self._loop.remove_reader(fd)
+        self._hangups.unregister(fd)
+        timer = self._timers.pop(source, None)
+        if timer:
+            timer.cancel()
+        device = InputHub._device_of(source)
+        path = device.device_path
+        device.close()
+        if self.discovery and source not in self._unplugged:
+            self._unplugged.append(source)
+        if report:
+            self._queue.put_nowait((source, ('device_removed', device.DEVICE_NAME, path)))
+
+    def _drain_discovery(self):
+        while True:
+            event = self.discovery.read_event(timeout=None)
+            if event is None:
+                break
+            kind, name, path = event
+            if kind == 'device_removed':
+                for source in list(self._readers):
+                    if InputHub._device_of(source).device_path == path:
+                        self._unplug(source)
+            else:
+                for source in list(self._unplugged):
+                    device = InputHub._device_of(source)
+                    if device.DEVICE_NAME == name:
+                        # Re-enumerated devices can come back under another eventN
+                        device.device_path = path
+                        if device.open():
+                            self._unplugged.remove(source)
+                            self._add(source)
+            self._queue.put_nowait((self.discovery, event))
+
+    def _schedule(self, device: InputDevice):
+        # Wake up for timed events such as GpioKeys long presses
+        timer = self._timers.pop(device, None)
+        if timer:
+            timer.cancel()
+        next_timeout = getattr(device, 'next_timeout', None)
+        due = next_timeout() if next_timeout else None
+        if due is not None:
+            self._timers[device] = self._loop.call_later(due, self._drain, device)
+
+    async def read_event(self) -> Tuple[InputDevice, Any]:
+        return await self._queue.get()
+
+    def close(self):
+        if not self._loop:
+            return
+        for fd in self._readers.values():
+            self._loop.remove_reader(fd)
+            self._hangups.unregister(fd)
+        self._readers = {}
+        self._unplugged = []
+        if self.discovery:
+            self._loop.remove_reader(self.discovery.fileno())
+            self.discovery = None
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers = {}
+        self._loop = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Tuple[InputDevice, Any]:
+        return await self.read_event()
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
@@ -7,24 +7,18 @@
 import os
 import time
 import struct
-import mmap
 import subprocess
 import sys
-import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 import select
-import glob
+from framebuffer import RGB565Display as BaseDisplay
+from input import get_discovery
 
 # 屏幕参数
 SCREEN_WIDTH = 320
 SCREEN_HEIGHT = 172
 FB_DEVICE = '/dev/fb0'
 
-# 物理屏幕尺寸 (需要根据实际硬件调整)
-PHYSICAL_WIDTH = 172
-PHYSICAL_HEIGHT = 320
-BPP = 16
-
 # 触摸控制全局变量
 TOUCH_DISABLED = 0  # 1=禁用触摸退出，0=启用触摸退出
 
@@ -105,12 +99,17 @@ def load_lt6911_driver():
 
 class TouchMonitor:
     """触摸事件监控器"""
+    # struct input_event，一次read最多读取的事件数
+    EVENT_FORMAT = 'LLHHi'
+    EVENT_SIZE = struct.calcsize(EVENT_FORMAT)
+    READ_BATCH = 64
+
     def __init__(self):
         self.touch_device = self._find_touch_device()
         self.touch_fd = None
         if self.touch_device:
             try:
-                self.touch_fd = open(self.touch_device, 'rb')
+                self.touch_fd = open(self.touch_device, 'rb', buffering=0)
                 print(f"成功打开触摸设备: {self.touch_device}")
             except Exception as e:
                 print(f"打开触摸设备失败: {e}")
@@ -118,20 +117,12 @@ class TouchMonitor:
     
     def _find_touch_device(self):
         """查找名为hyn_ts的触摸设备"""
-        for event_dev in glob.glob('/dev/input/event*'):
-            try:
-                device_name_path = f"/sys/class/input/{os.path.basename(event_dev)}/device/name"
-                if os.path.exists(device_name_path):
-                    with open(device_name_path, 'r') as f:
-                        name = f.read().strip()
-                    if name == 'hyn_ts':
-                        print(f"找到触摸设备: {event_dev}")
-                        return event_dev
-            except Exception as e:
-                print(f"检查设备 {event_dev} 时出错: {e}")
-                continue
-        print("未找到名为 'hyn_ts' 的触摸设备")
-        return None
+        event_dev = get_discovery().find('hyn_ts')
+        if event_dev:
+            print(f"找到触摸设备: {event_dev}")
+        else:
+            print("未找到名为 'hyn_ts' 的触摸设备")
+        return event_dev
     
     def check_touch_event(self, timeout=1):
         """检查触摸事件，返回True表示有触摸事件"""
@@ -148,19 +139,18 @@ class TouchMonitor:
             print(f"等待触摸事件，超时: {timeout}秒")  # 调试信息
             rlist, _, _ = select.select([self.touch_fd], [], [], timeout)
             if rlist:
-                # 读取完整的输入事件数据结构 (24字节)
-                data = self.touch_fd.read(24)
-                if len(data) == 24:
-                    # 解析输入事件 (struct input_event)
-                    sec, usec, type, code, value = struct.unpack('LLHHi', data)
+                # 一次系统调用读出所有已就绪的输入事件 (每个24字节)
+                data = os.read(self.touch_fd.fileno(), self.READ_BATCH * self.EVENT_SIZE)
+                size = len(data) - len(data) % self.EVENT_SIZE
+                if size == 0:
+                    print(f"读取的数据长度不正确: {len(data)} 字节")
+                for sec, usec, type, code, value in struct.iter_unpack(self.EVENT_FORMAT, data[:size]):
                     print(f"收到输入事件: type={type}, code={code}, value={value}, time={sec}.{usec}")
                     
                     # 简化：任何事件都认为是触摸
                     if type in [1, 3]:  # EV_KEY 或 EV_ABS
                         print("检测到触摸事件")
                         return True
-                else:
-                    print(f"读取的数据长度不正确: {len(data)} 字节")
             else:
                 print("select超时，无触摸事件")  # 调试信息
                 pass
@@ -175,21 +165,9 @@ class TouchMonitor:
             self.touch_fd.close()
             print("触摸设备已关闭")
 
-class RGB565Display:
+class RGB565Display(BaseDisplay):
     def __init__(self, fb_device="/dev/fb0"):
-        self.physical_width = PHYSICAL_WIDTH
-        self.physical_height = PHYSICAL_HEIGHT
-        self.bpp = BPP
-        self.fb_size = self.physical_width * self.physical_height * (self.bpp // 8)
-
-        # 打开framebuffer设备
-        self.fb_fd = os.open(fb_device, os.O_RDWR)
-        self.fb_mmap = mmap.mmap(
-            self.fb_fd, self.fb_size, mmap.MAP_SHARED, mmap.PROT_WRITE
-        )
-        self.fb_array = np.frombuffer(self.fb_mmap, dtype=np.uint16).reshape(
-            (self.physical_height, self.physical_width)
-        )
+        super().__init__(fb_device)
         
         # 加载字体
         self._load_fonts()
@@ -225,14 +203,6 @@ class RGB565Display:
                 self.font_medium = ImageFont.load_default()
                 self.font_small = ImageFont.load_default()
 
-    def rgb_to_rgb565(self, r, g, b):
-        """将RGB颜色转换为RGB565格式"""
-        return ((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)
-
-    def clear_screen(self, color=0x0000):
-        """清屏"""
-        self.fb_array.fill(color)
-
     def draw_countdown_screen(self, seconds_remaining):
         """绘制倒计时屏幕"""
         # 创建逻辑尺寸图像（横屏320x172）
@@ -424,41 +394,10 @@ class RGB565Display:
                 self.clear_screen(current_color)
                 time.sleep(delay)
 
-    def _display_image(self, logical_img):
-        """将逻辑图像旋转并显示到物理屏幕"""
-        # 将逻辑图像逆时针旋转90度得到物理图像
-        physical_img = logical_img.rotate(90, expand=True)
-
-        # 转换为RGB565并复制到framebuffer
-        rgb_array = np.array(physical_img)
-        r = (rgb_array[:, :, 0] >> 3).astype(np.uint16)
-        g = (rgb_array[:, :, 1] >> 2).astype(np.uint16)
-        b = (rgb_array[:, :, 2] >> 3).astype(np.uint16)
-        rgb565 = (r << 11) | (g << 5) | b
-
-        # 直接复制整个数组到framebuffer
-        self.fb_array[:, :] = rgb565
-
-    # def close(self):
-    #     """关闭显示资源"""
-    #     self.fb_mmap.close()
-    #     os.close(self.fb_fd)
-
     def close(self):
         """关闭显示资源"""
         try:
-            # 首先删除numpy数组的引用
-            if hasattr(self, 'fb_array'):
-                del self.fb_array
-            
-            # 然后关闭mmap
-            if hasattr(self, 'fb_mmap'):
-                self.fb_mmap.close()
-            
-            # 最后关闭文件描述符
-            if hasattr(self, 'fb_fd'):
-                os.close(self.fb_fd)
-                
+            super().close()
             print("显示资源已释放")
         except Exception as e:
             print(f"关闭显示资源时出错: {e}")
@@ -24,6 +24,8 @@ class AtxController:
 
     def __init__(self):
         self.power_on = False
+        # Called with the new status from the monitor thread
+        self.on_change = None
         self._running = False
         self._monitor_thread = None
         self._lock = threading.Lock()
@@ -96,9 +98,12 @@ class AtxController:
                         new_status = (value == '0')
 
                         with self._lock:
-                            if new_status != self.power_on:
+                            changed = new_status != self.power_on
+                            if changed:
                                 self.power_on = new_status
                                 print(f"[EPOLL] Power status changed: {'ON' if self.power_on else 'OFF'}")
+                        if changed and self.on_change:
+                            self.on_change(new_status)
 
             epoll.unregister(self._gpio_fd)
             epoll.close()
@@ -116,9 +121,12 @@ class AtxController:
                         new_status = (value == '0')
 
                         with self._lock:
-                            if new_status != self.power_on:
+                            changed = new_status != self.power_on
+                            if changed:
                                 self.power_on = new_status
                                 print(f"[POLL] Power status changed: {'ON' if self.power_on else 'OFF'}")
+                        if changed and self.on_change:
+                            self.on_change(new_status)
             except Exception as e:
                 print(f"Error reading GPIO: {e}")
 
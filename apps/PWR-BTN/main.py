@@ -1,33 +1,37 @@
 #!/usr/bin/env python3
 
 from framebuffer import Framebuffer
-from input import TouchScreen, GpioKeys
+from input import TouchScreen, TouchMapper, GpioKeys, InputHub
 from atx import AtxController, AtxUI
+from scheduler import Scheduler
 
 def run_atx_mode(fb: Framebuffer):
     controller = AtxController()
     ui = AtxUI(fb)
+    scheduler = Scheduler()
 
+    # The monitor thread sees GPIO edges as they happen; redraw on the main thread
+    controller.on_change = lambda power_on: scheduler.call_soon_threadsafe(ui.update_power_status, power_on)
     controller.start_monitoring()
 
     ui.draw_ui(controller.get_power_status())
-    last_power_status = controller.get_power_status()
     pressed_button = None
 
     try:
-        with TouchScreen() as touch, GpioKeys() as keys:
+        with TouchScreen(coalesce_moves=True) as touch, GpioKeys() as keys, InputHub() as hub:
+            hub.add(touch)
+            hub.add(keys)
+            mapper = TouchMapper.for_device(touch, rotation=fb.rotation)
             print("ATX Control started")
 
             while True:
-                current_status = controller.get_power_status()
-                if current_status != last_power_status:
-                    last_power_status = current_status
-                    ui.update_power_status(current_status)
+                # Sleeps until input or a power status change
+                source, event = scheduler.wait(hub) or (None, None)
 
-                touch_event = touch.read_event(timeout=0.01)
+                touch_event = event if source is touch else None
                 if touch_event:
                     event_type, x, y, touching = touch_event
-                    screen_x, screen_y = TouchScreen.map_coords_270(x, y)
+                    screen_x, screen_y = mapper.map(x, y)
 
                     if event_type == 'touch_down':
                         if ui.is_exit_button_pressed(screen_x, screen_y):
@@ -64,7 +68,7 @@ def run_atx_mode(fb: Framebuffer):
 
                         pressed_button = None
 
-                key_event = keys.read_event(timeout=0.01)
+                key_event = event if source is keys else None
                 if key_event:
                     event_type, key_name, pressed, duration, is_long_press = key_event
 
@@ -76,6 +80,7 @@ def run_atx_mode(fb: Framebuffer):
         print("\nInterrupted by user")
     finally:
         controller.stop_monitoring()
+        scheduler.close()
         fb.fill_screen((0, 0, 0))
 
 def main():
@@ -0,0 +1,956 @@
+#!/usr/bin/env python3
+
+# Display module shared by all apps. Edit common/framebuffer.py and run
+# scripts/sync_common.py; the copies in the app folders are generated.
+
+import os
+import stat
+import mmap
+import struct
+import fcntl
+from collections import OrderedDict
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# NanoKVM panel geometry, assumed when the framebuffer is stood in for by a
+# regular file or anonymous memory (NANOKVM_FB, see simulator/)
+PANEL_WIDTH = 172
+PANEL_HEIGHT = 320
+PANEL_BPP = 16
+ANON_DEVICE = 'anon'
+
+# Called as hook(display) whenever a frame reaches the screen
+frame_hooks = []
+
+
+def resolve_fb_device(fb_device):
+    # NANOKVM_FB replaces the device with a file path or 'anon'
+    return os.environ.get('NANOKVM_FB') or fb_device
+
+
+def open_fb(fb_device):
+    """Open a framebuffer device or a file standing in for one; None means anonymous memory."""
+    if fb_device == ANON_DEVICE:
+        return None
+    flags = os.O_RDWR
+    if not fb_device.startswith('/dev/'):
+        flags |= os.O_CREAT
+    return os.open(fb_device, flags, 0o644)
+
+
+def is_fb_device(fd):
+    return fd is not None and stat.S_ISCHR(os.fstat(fd).st_mode)
+
+
+def map_fb(fd, size):
+    """Map size bytes of the framebuffer; regular files are grown to fit."""
+    if fd is None:
+        return mmap.mmap(-1, size)
+    if not is_fb_device(fd) and os.fstat(fd).st_size < size:
+        os.ftruncate(fd, size)
+    return mmap.mmap(fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+
+
+def rgb565_to_rgb888(pixels):
+    # Replicate the top bits into the low ones so white stays 255
+    rgb = np.empty(pixels.shape + (3,), dtype=np.uint8)
+    r = (pixels >> 11) & 0x1F
+    g = (pixels >> 5) & 0x3F
+    b = pixels & 0x1F
+    rgb[..., 0] = (r << 3) | (r >> 2)
+    rgb[..., 1] = (g << 2) | (g >> 4)
+    rgb[..., 2] = (b << 3) | (b >> 2)
+    return rgb
+
+
+class GlyphCache:
+    """LRU of per-character glyph masks keyed by (font path, font size, char).
+
+    Each entry holds the 8-bit coverage used for antialiased blending, the
+    thresholded ink mask used by Framebuffer.draw_text, the offset of the mask
+    from the pen position and the advance width.
+    """
+
+    def __init__(self, max_bytes=512 * 1024):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self._glyphs = OrderedDict()
+
+    def glyph(self, font, font_path, font_size, char):
+        key = (font_path, font_size, char)
+        entry = self._glyphs.get(key)
+        if entry is not None:
+            self._glyphs.move_to_end(key)
+            return entry
+
+        left, top, right, bottom = font.getbbox(char)
+        if right > left and bottom > top:
+            img = Image.new('L', (right - left, bottom - top), 0)
+            ImageDraw.Draw(img).text((-left, -top), char, font=font, fill=255)
+            coverage = np.array(img)
+            ink = coverage > 128
+            size = coverage.nbytes + ink.nbytes
+        else:
+            coverage = ink = None
+            size = 0
+        entry = (coverage, ink, left, top, font.getlength(char), size)
+
+        self._glyphs[key] = entry
+        self.used_bytes += size
+        while self.used_bytes > self.max_bytes and len(self._glyphs) > 1:
+            _, old = self._glyphs.popitem(last=False)
+            self.used_bytes -= old[5]
+        return entry
+
+    def clear(self):
+        self._glyphs.clear()
+        self.used_bytes = 0
+
+_glyph_cache = GlyphCache()
+
+class PageFlip:
+    """Two screen pages stacked in the framebuffer's virtual resolution.
+
+    Drawing goes to the hidden page (back) and flip() shows it with
+    FBIOPAN_DISPLAY, then waits for vsync so the old page is no longer being
+    scanned out before it is drawn into again. supported is False when the
+    driver cannot pan or its memory holds only one page; callers then keep
+    their single-buffer path.
+    """
+
+    FBIOGET_VSCREENINFO = 0x4600
+    FBIOPUT_VSCREENINFO = 0x4601
+    FBIOGET_FSCREENINFO = 0x4602
+    FBIOPAN_DISPLAY = 0x4606
+    FBIO_WAITFORVSYNC = 0x40044620
+    # struct fb_fix_screeninfo up to line_length, native alignment
+    FSCREENINFO_FORMAT = '16sLIIIIHHHI'
+
+    def __init__(self, fb):
+        self.fb = fb
+        self.fbmem = None
+        self.supported = False
+        self.vsync = True
+        self.front = 0
+        self.width = 0
+        self.height = 0
+        self.line_length = 0
+        self.page_size = 0
+        self.vinfo = bytearray(160)
+        self._saved_vinfo = None
+
+        fileno = fb.fileno() if hasattr(fb, 'fileno') else fb
+        if not is_fb_device(fileno):
+            return
+
+        try:
+            fcntl.ioctl(fb, self.FBIOGET_VSCREENINFO, self.vinfo)
+            finfo = bytearray(128)
+            fcntl.ioctl(fb, self.FBIOGET_FSCREENINFO, finfo)
+        except OSError as e:
+            print(f"page flip: cannot query screen info: {e}")
+            return
+
+        fix = struct.unpack_from(self.FSCREENINFO_FORMAT, finfo)
+        smem_len, ypanstep, line_length = fix[2], fix[7], fix[9]
+        self.width, self.height, _, yres_virtual = struct.unpack_from('4I', self.vinfo)
+        bpp = struct.unpack_from('I', self.vinfo, 24)[0]
+        self.line_length = line_length or self.width * bpp // 8
+        self.page_size = self.line_length * self.height
+
+        if ypanstep == 0 or smem_len < 2 * self.page_size:
+            return
+
+        if yres_virtual < 2 * self.height:
+            # Ask for a second page; the driver may refuse
+            self._saved_vinfo = bytes(self.vinfo)
+            struct.pack_into('I', self.vinfo, 12, 2 * self.height)
+            try:
+                fcntl.ioctl(fb, self.FBIOPUT_VSCREENINFO, self.vinfo)
+                fcntl.ioctl(fb, self.FBIOGET_VSCREENINFO, self.vinfo)
+            except OSError:
+                self.vinfo[:] = self._saved_vinfo
+                self._saved_vinfo = None
+                return
+            if struct.unpack_from('I', self.vinfo, 12)[0] < 2 * self.height:
+                return
+
+        self.fbmem = map_fb(fileno, 2 * self.page_size)
+        self.front = struct.unpack_from('I', self.vinfo, 20)[0] // self.height % 2
+        self.supported = True
+
+    @property
+    def back(self):
+        return 1 - self.front
+
+    def offset(self, page):
+        return page * self.page_size
+
+    def page(self, page, dtype=np.uint16):
+        # (height, width) pixel view of one page, for 16 and 32 bpp.
+        itemsize = np.dtype(dtype).itemsize
+        rows = np.frombuffer(self.fbmem, dtype=dtype, count=self.page_size // itemsize,
+                             offset=self.offset(page))
+        return rows.reshape(self.height, self.line_length // itemsize)[:, :self.width]
+
+    def flip(self):
+        """Show the back page; returns once the old front page is off screen."""
+        struct.pack_into('II', self.vinfo, 16, 0, self.back * self.height)
+        fcntl.ioctl(self.fb, self.FBIOPAN_DISPLAY, self.vinfo)
+        self.front = self.back
+        if self.vsync:
+            try:
+                fcntl.ioctl(self.fb, self.FBIO_WAITFORVSYNC, struct.pack('I', 0))
+            except OSError:
+                # Not every driver implements it; panning alone still avoids tearing
+                self.vsync = False
+
+    def close(self):
+        # Callers must drop their page views first, numpy holds the mmap open.
+        if self.fbmem is None:
+            return
+        if self.front != 0:
+            # Leave the current image on page 0 for whoever draws next
+            self.fbmem[:self.page_size] = self.fbmem[self.page_size:2 * self.page_size]
+            struct.pack_into('II', self.vinfo, 16, 0, 0)
+            try:
+                fcntl.ioctl(self.fb, self.FBIOPAN_DISPLAY, self.vinfo)
+            except OSError:
+                pass
+            self.front = 0
+        if self._saved_vinfo is not None:
+            try:
+                fcntl.ioctl(self.fb, self.FBIOPUT_VSCREENINFO, bytearray(self._saved_vinfo))
+            except OSError:
+                pass
+        self.fbmem.close()
+        self.fbmem = None
+
+class Framebuffer:
+    FBIOGET_VSCREENINFO = 0x4600
+    FBIOGET_FSCREENINFO = 0x4602
+    MAX_DAMAGE_RECTS = 16
+
+    def __init__(self, fb_device='/dev/fb0', rotation=0, font_path='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', font_size=16, page_flip=False):
+        self.fb_device = resolve_fb_device(fb_device)
+        self.page_flip = page_flip
+        self.pages = None
+        self.fb = None
+        self.fbmem = None
+        self.width = 0
+        self.height = 0
+        self.bpp = 0
+        self.line_length = 0
+        self.rotation = rotation
+        self.physical_width = 0
+        self.physical_height = 0
+        self.font_path = font_path
+        self.font_size = font_size
+        self.font = None
+        self.buffer = None
+        self.pixels = None
+        self.surface = None
+        self.fb_pixels = None
+        self.glyph_cache = _glyph_cache
+        self._damage = []
+
+        self.open()
+
+    def __del__(self):
+        self.close()
+
+    def open(self):
+        try:
+            fd = open_fb(self.fb_device)
+            self.fb = os.fdopen(fd, 'r+b', buffering=0) if fd is not None else None
+            line_length = 0
+            if is_fb_device(fd):
+                vinfo_buf = bytearray(160)
+                fcntl.ioctl(self.fb, self.FBIOGET_VSCREENINFO, vinfo_buf)
+                self.physical_width = struct.unpack('I', vinfo_buf[0:4])[0]
+                self.physical_height = struct.unpack('I', vinfo_buf[4:8])[0]
+                self.bpp = struct.unpack('I', vinfo_buf[24:28])[0]
+                finfo_buf = bytearray(128)
+                try:
+                    fcntl.ioctl(self.fb, self.FBIOGET_FSCREENINFO, finfo_buf)
+                    line_length = struct.unpack_from(PageFlip.FSCREENINFO_FORMAT, finfo_buf)[9]
+                except OSError:
+                    pass
+            else:
+                # A file or memory standing in for the NanoKVM panel
+                self.physical_width = PANEL_WIDTH
+                self.physical_height = PANEL_HEIGHT
+                self.bpp = PANEL_BPP
+            self.line_length = line_length or self.physical_width * self.bpp // 8
+
+            if self.rotation == 90 or self.rotation == 270:
+                self.width = self.physical_height
+                self.height = self.physical_width
+            else:
+                self.width = self.physical_width
+                self.height = self.physical_height
+
+            screensize = self.line_length * self.physical_height
+            if self.page_flip and self.fb:
+                self.pages = PageFlip(self.fb)
+                if not self.pages.supported:
+                    print("page flip not supported, falling back to a single buffer")
+                    self.pages = None
+
+            if self.pages:
+                # Draw straight into the hidden page; swap_buffer pans to it
+                self.fbmem = self.pages.fbmem
+                self.pixels = self._pixel_view(self.fbmem, self.pages.offset(self.pages.back))
+                self.pixels[...] = 0
+            else:
+                self.fbmem = map_fb(fd, screensize)
+                self.buffer = bytearray(screensize)
+                self.pixels = self._pixel_view(self.buffer)
+                self.fb_pixels = self._pixel_view(self.fbmem)
+            self.surface = self._logical_view(self.pixels)
+            self._damage = [(0, 0, self.physical_width, self.physical_height)]
+
+            try:
+                self.font = ImageFont.truetype(self.font_path, self.font_size)
+            except Exception as e:
+                print(f"failed to load font {self.font_path}: {e}")
+                self.font = ImageFont.load_default()
+
+            return True
+
+        except Exception as e:
+            print(f"open framebuffer device failed: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
+    def close(self):
+        self.fb_pixels = None
+        self.surface = None
+        self.pixels = None
+        self.buffer = None
+        if self.pages:
+            self.pages.close()
+            self.pages = None
+            self.fbmem = None
+        if self.fbmem:
+            self.fbmem.close()
+            self.fbmem = None
+        if self.fb:
+            self.fb.close()
+            self.fb = None
+
+    def swap_buffer(self, full=False):
+        if not self.fbmem or self.pixels is None:
+            return
+
+        presented = full or bool(self._damage)
+        if self.pages:
+            self._flip(full)
+        elif full or self.fb_pixels is None:
+            self.fbmem.seek(0)
+            self.fbmem.write(self.buffer)
+        else:
+            for px0, py0, px1, py1 in self._damage:
+                self.fb_pixels[py0:py1, px0:px1] = self.pixels[py0:py1, px0:px1]
+        self._damage = []
+
+        if presented:
+            for hook in frame_hooks:
+                hook(self)
+
+    def snapshot(self):
+        """The image on screen as a (height, width, 3) RGB array in logical orientation."""
+        if self.pages:
+            shown = self._pixel_view(self.fbmem, self.pages.offset(self.pages.front))
+        else:
+            shown = self.fb_pixels
+        view = self._logical_view(shown)
+        if self.bpp == 16:
+            return rgb565_to_rgb888(view)
+        elif self.bpp == 32:
+            return np.stack([(view >> 16) & 0xFF, (view >> 8) & 0xFF, view & 0xFF], axis=-1).astype(np.uint8)
+        # 24 bpp is stored as (b, g, r)
+        return view[:, :, ::-1].copy()
+
+    def _flip(self, full):
+        if not full and not self._damage:
+            return
+        shown = self.pixels
+        self.pages.flip()
+        self.pixels = self._pixel_view(self.fbmem, self.pages.offset(self.pages.back))
+        self.surface = self._logical_view(self.pixels)
+        # The new hidden page is one frame behind; copy this frame's damage over
+        if full:
+            self.pixels[...] = shown
+        else:
+            for px0, py0, px1, py1 in self._damage:
+                self.pixels[py0:py1, px0:px1] = shown[py0:py1, px0:px1]
+
+    def get_damage(self):
+        # Physical (x0, y0, x1, y1) rects drawn since the last swap or reset.
+        return list(self._damage)
+
+    def reset_damage(self):
+        self._damage = []
+
+    def _add_damage(self, x0, y0, x1, y1):
+        rects = self._damage
+        i = 0
+        while i < len(rects):
+            dx0, dy0, dx1, dy1 = rects[i]
+            if x0 <= dx1 and dx0 <= x1 and y0 <= dy1 and dy0 <= y1:
+                x0, y0 = min(x0, dx0), min(y0, dy0)
+                x1, y1 = max(x1, dx1), max(y1, dy1)
+                rects.pop(i)
+                i = 0
+            else:
+                i += 1
+        rects.append((x0, y0, x1, y1))
+
+        if len(rects) > self.MAX_DAMAGE_RECTS:
+            self._damage = [(min(r[0] for r in rects), min(r[1] for r in rects),
+                             max(r[2] for r in rects), max(r[3] for r in rects))]
+
+    def set_font(self, font_path, font_size):
+        try:
+            self.font = ImageFont.truetype(font_path, font_size)
+            self.font_path = font_path
+            self.font_size = font_size
+            return True
+        except Exception as e:
+            print(f"Failed to load font {font_path}: {e}")
+            return False
+
+    def _pixel_view(self, buf, offset=0):
+        # Rows of physical pixels sharing memory with buf, so drawing is plain
+        # slice assignment. 24 bpp has no native dtype and keeps a byte axis.
+        rows = self.physical_height
+        count = rows * self.line_length
+        if self.bpp == 32:
+            view = np.frombuffer(buf, dtype=np.uint32, count=count // 4, offset=offset)
+            view = view.reshape(rows, self.line_length // 4)
+        elif self.bpp == 24:
+            # The pitch need not be a multiple of 3, so spell out the strides
+            return np.ndarray((rows, self.physical_width, 3), dtype=np.uint8, buffer=buf,
+                              offset=offset, strides=(self.line_length, 3, 1))
+        elif self.bpp == 16:
+            view = np.frombuffer(buf, dtype=np.uint16, count=count // 2, offset=offset)
+            view = view.reshape(rows, self.line_length // 2)
+        else:
+            return None
+        # Drop any padding at the end of each line
+        return view[:, :self.physical_width]
+
+    def _logical_view(self, pixels):
+        # Transposed/flipped view so that view[y, x] is logical pixel (x, y);
+        # drawing through it needs no per-pixel coordinate transform.
+        if pixels is None:
+            return None
+        if self.rotation == 90:
+            return np.rot90(pixels, 1)
+        elif self.rotation == 180:
+            return np.rot90(pixels, 2)
+        elif self.rotation == 270:
+            return np.rot90(pixels, -1)
+        return pixels
+
+    def _pack_color(self, color):
+        r, g, b = color
+
+        if self.bpp == 32:
+            return (r << 16) | (g << 8) | b
+        elif self.bpp == 24:
+            return (b, g, r)
+        elif self.bpp == 16:
+            return ((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)
+        return None
+
+    def _rotate_rect(self, x0, y0, x1, y1):
+        # Map a clipped logical rect [x0, x1) x [y0, y1) to physical space.
+        pw = self.physical_width
+        ph = self.physical_height
+        if self.rotation == 90:
+            return pw - y1, x0, pw - y0, x1
+        elif self.rotation == 180:
+            return pw - x1, ph - y1, pw - x0, ph - y0
+        elif self.rotation == 270:
+            return y0, ph - x1, y1, ph - x0
+        else:
+            return x0, y0, x1, y1
+
+    def _blit_mask(self, x, y, mask, pixel):
+        height, width = mask.shape
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + width, self.width)
+        y1 = min(y + height, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        self.surface[y0:y1, x0:x1][mask[y0 - y:y1 - y, x0 - x:x1 - x]] = pixel
+        self._add_damage(*self._rotate_rect(x0, y0, x1, y1))
+
+    def _fill_rect(self, x, y, width, height, pixel):
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + width, self.width)
+        y1 = min(y + height, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        self.surface[y0:y1, x0:x1] = pixel
+        self._add_damage(*self._rotate_rect(x0, y0, x1, y1))
+
+    def fill_screen(self, color, auto_swap=True):
+        if self.pixels is None:
+            print("error: framebuffer not opened")
+            return
+
+        pixel = self._pack_color(color)
+        if pixel is None:
+            print(f"unsupported bits per pixel: {self.bpp}")
+            return
+
+        self.pixels[...] = pixel
+        self._damage = [(0, 0, self.physical_width, self.physical_height)]
+
+        if auto_swap:
+            self.swap_buffer()
+
+    def clear(self, auto_swap=True):
+        self.fill_screen((0, 0, 0), auto_swap=auto_swap)
+
+    def draw_pixel(self, x, y, color):
+        if self.pixels is None:
+            return
+
+        if x < 0 or x >= self.width or y < 0 or y >= self.height:
+            return
+
+        pixel = self._pack_color(color)
+        if pixel is None:
+            return
+
+        self.surface[y, x] = pixel
+        self._add_damage(*self._rotate_rect(x, y, x + 1, y + 1))
+
+    def mark_damaged(self, x, y, width, height):
+        # For callers that write to self.surface directly.
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + width, self.width)
+        y1 = min(y + height, self.height)
+        if x0 < x1 and y0 < y1:
+            self._add_damage(*self._rotate_rect(x0, y0, x1, y1))
+
+    def draw_text(self, x, y, text, color, auto_swap=True):
+        if self.pixels is None or not self.font:
+            return
+
+        pixel = self._pack_color(color)
+        if pixel is None:
+            return
+
+        placed = []
+        pen = 0.0
+        left = top = None
+        for char in text:
+            _, mask, gx, gy, advance, _ = self.glyph_cache.glyph(self.font, self.font_path, self.font_size, char)
+            if mask is not None:
+                gx += round(pen)
+                placed.append((gx, gy, mask))
+                left = gx if left is None else min(left, gx)
+                top = gy if top is None else min(top, gy)
+            pen += advance
+
+        # (x, y) is the top-left of the string's ink box, as before.
+        for gx, gy, mask in placed:
+            self._blit_mask(x + gx - left, y + gy - top, mask, pixel)
+
+        if auto_swap:
+            self.swap_buffer()
+
+    def draw_rect(self, x, y, width, height, color, auto_swap=True):
+        if self.pixels is None:
+            return
+
+        pixel = self._pack_color(color)
+        if pixel is None:
+            return
+
+        self._fill_rect(x, y, width, height, pixel)
+
+        if auto_swap:
+            self.swap_buffer()
+
+    def draw_hline(self, x, y, length, color, auto_swap=True):
+        self.draw_rect(x, y, length, 1, color, auto_swap=auto_swap)
+
+    def draw_vline(self, x, y, length, color, auto_swap=True):
+        self.draw_rect(x, y, 1, length, color, auto_swap=auto_swap)
+
+    def get_text_size(self, text):
+        if not self.font:
+            return (0, 0)
+
+        bbox = self.font.getbbox(text)
+        width = bbox[2] - bbox[0]
+        height = bbox[3] - bbox[1]
+        if bbox[1] < 0:
+            height += -bbox[1]
+        return (width, height)
+
+    def get_info(self):
+        return {
+            'device': self.fb_device,
+            'width': self.width,
+            'height': self.height,
+            'bpp': self.bpp,
+            'line_length': self.line_length,
+            'is_open': self.fbmem is not None
+        }
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+class RGB565Canvas:
+    """Landscape drawing surface kept in RGB565 so frames never go through RGB888.
+
+    pixels[y, x] is logical pixel (x, y). Drawing calls grow a dirty rect, and
+    RGB565Display._display_canvas copies only that rect to the screen.
+    Colors are (r, g, b) tuples, as with Framebuffer.
+    """
+
+    def __init__(self, width=320, height=172, color=(0, 0, 0)):
+        self.width = width
+        self.height = height
+        self.pixels = np.zeros((height, width), dtype=np.uint16)
+        self.glyph_cache = _glyph_cache
+        self._dirty = None
+        self.fill_screen(color)
+
+    @staticmethod
+    def pack_color(color):
+        r, g, b = color
+        return ((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)
+
+    def _clip(self, x, y, width, height):
+        x0 = max(int(x), 0)
+        y0 = max(int(y), 0)
+        x1 = min(int(x + width), self.width)
+        y1 = min(int(y + height), self.height)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return x0, y0, x1, y1
+
+    def _mark(self, x0, y0, x1, y1):
+        if self._dirty is None:
+            self._dirty = (x0, y0, x1, y1)
+        else:
+            dx0, dy0, dx1, dy1 = self._dirty
+            self._dirty = (min(x0, dx0), min(y0, dy0), max(x1, dx1), max(y1, dy1))
+
+    def take_dirty(self):
+        # Return the logical (x0, y0, x1, y1) changed since the last call and reset it.
+        dirty = self._dirty
+        self._dirty = None
+        return dirty
+
+    def mark_damaged(self, x, y, width, height):
+        # For callers that write to self.pixels directly.
+        rect = self._clip(x, y, width, height)
+        if rect:
+            self._mark(*rect)
+
+    def fill_screen(self, color):
+        self.pixels.fill(self.pack_color(color))
+        self._dirty = (0, 0, self.width, self.height)
+
+    def draw_rect(self, x, y, width, height, color):
+        rect = self._clip(x, y, width, height)
+        if not rect:
+            return
+        x0, y0, x1, y1 = rect
+        self.pixels[y0:y1, x0:x1] = self.pack_color(color)
+        self._mark(x0, y0, x1, y1)
+
+    def draw_hline(self, x, y, length, color):
+        self.draw_rect(x, y, length, 1, color)
+
+    def draw_vline(self, x, y, length, color):
+        self.draw_rect(x, y, 1, length, color)
+
+    def draw_line(self, x0, y0, x1, y1, color, width=1):
+        x0, y0, x1, y1 = (int(round(v)) for v in (x0, y0, x1, y1))
+        if width == 1 and y0 == y1:
+            self.draw_hline(min(x0, x1), y0, abs(x1 - x0) + 1, color)
+            return
+        if width == 1 and x0 == x1:
+            self.draw_vline(x0, min(y0, y1), abs(y1 - y0) + 1, color)
+            return
+
+        # Step along the major axis and stamp a width x width square per
+        # point; lines here are short enough that slicing beats fancy indexing.
+        pixel = self.pack_color(color)
+        pixels = self.pixels
+        dx = x1 - x0
+        dy = y1 - y0
+        steps = max(abs(dx), abs(dy))
+        div = 2 * steps or 1
+        lo = (width - 1) // 2
+        for i in range(steps + 1):
+            x = x0 + (2 * dx * i + steps) // div - lo
+            y = y0 + (2 * dy * i + steps) // div - lo
+            pixels[max(y, 0):max(y + width, 0), max(x, 0):max(x + width, 0)] = pixel
+        self.mark_damaged(min(x0, x1) - lo, min(y0, y1) - lo, abs(dx) + width, abs(dy) + width)
+
+    def _blend(self, x, y, coverage, color):
+        height, width = coverage.shape
+        rect = self._clip(x, y, width, height)
+        if not rect:
+            return
+        x0, y0, x1, y1 = rect
+        alpha = coverage[y0 - y:y1 - y, x0 - x:x1 - x].astype(np.int32)
+        region = self.pixels[y0:y1, x0:x1]
+        dst = region.astype(np.int32)
+
+        r, g, b = color
+        out = 0
+        for shift, bits, src in ((11, 0x1F, r >> 3), (5, 0x3F, g >> 2), (0, 0x1F, b >> 3)):
+            channel = (dst >> shift) & bits
+            channel += ((src - channel) * alpha + 127) // 255
+            out = out | (channel << shift)
+        region[...] = out
+        self._mark(x0, y0, x1, y1)
+
+    def draw_text(self, x, y, text, color, font):
+        """Antialiased text with (x, y) as the text origin, as in ImageDraw.text."""
+        key = (getattr(font, 'path', None) or id(font), getattr(font, 'size', None))
+        x = int(round(x))
+        y = int(round(y))
+        pen = 0.0
+        for char in text:
+            coverage, _, gx, gy, advance, _ = self.glyph_cache.glyph(font, key[0], key[1], char)
+            if coverage is not None:
+                self._blend(x + round(pen) + gx, y + gy, coverage, color)
+            pen += advance
+
+    def draw_image(self, img, x=0, y=0):
+        # Convert just this PIL image's area, e.g. for an icon drawn with ImageDraw.
+        rgb = np.asarray(img.convert('RGB'))
+        height, width = rgb.shape[:2]
+        rect = self._clip(x, y, width, height)
+        if not rect:
+            return
+        x0, y0, x1, y1 = rect
+        rgb = rgb[y0 - y:y1 - y, x0 - x:x1 - x].astype(np.uint16)
+        self.pixels[y0:y1, x0:x1] = ((rgb[:, :, 0] & 0xF8) << 8) | ((rgb[:, :, 1] & 0xFC) << 3) | (rgb[:, :, 2] >> 3)
+        self._mark(x0, y0, x1, y1)
+
+class TileDiff:
+    """Sends a frame to the screen one changed tile at a time.
+
+    A shadow copy of the last submitted frame is kept in RAM. submit() compares
+    the new frame with it, and only tiles with at least one changed pixel are
+    written to the framebuffer. Runs of neighbouring changed tiles in a tile
+    row go out as a single slice copy. With enabled=False every submit writes
+    the whole rect, which is handy for comparing the byte counters. rects lists
+    the logical (x0, y0, x1, y1) areas the last submit wrote.
+    """
+
+    def __init__(self, width=320, height=172, tile=16, enabled=True):
+        self.width = width
+        self.height = height
+        self.tile = tile
+        self.enabled = enabled
+        self.shadow = np.zeros((height, width), dtype=np.uint16)
+        self._valid = False
+        self.rects = []
+        self.frame_bytes = 0
+        self.total_bytes = 0
+        self.frames = 0
+
+    def reset(self, color=None):
+        # Call after the screen was written behind our back. With a color the
+        # shadow becomes that solid fill, otherwise the next submit is a full one.
+        if color is None:
+            self._valid = False
+        else:
+            self.shadow.fill(color)
+            self._valid = True
+
+    def submit(self, frame, target, rect=None):
+        """Copy the changed tiles of frame (inside rect) to target and return the bytes written."""
+        x0, y0, x1, y1 = rect or (0, 0, self.width, self.height)
+        written = 0
+        self.rects = []
+        if x0 < x1 and y0 < y1:
+            if self.enabled and self._valid:
+                written = self._submit_tiles(frame, target, x0, y0, x1, y1)
+            else:
+                target[y0:y1, x0:x1] = frame[y0:y1, x0:x1]
+                self.shadow[y0:y1, x0:x1] = frame[y0:y1, x0:x1]
+                self.rects.append((x0, y0, x1, y1))
+                written = (x1 - x0) * (y1 - y0) * 2
+                self._valid = self._valid or (x0, y0, x1, y1) == (0, 0, self.width, self.height)
+
+        self.frame_bytes = written
+        self.total_bytes += written
+        self.frames += 1
+        return written
+
+    def _submit_tiles(self, frame, target, x0, y0, x1, y1):
+        tile = self.tile
+        # Snap the rect to the tile grid so tiles stay aligned across frames
+        x0 -= x0 % tile
+        y0 -= y0 % tile
+        changed = frame[y0:y1, x0:x1] != self.shadow[y0:y1, x0:x1]
+        if not changed.any():
+            return 0
+        xs = np.arange(0, x1 - x0, tile)
+        ys = np.arange(0, y1 - y0, tile)
+        hits = np.logical_or.reduceat(np.logical_or.reduceat(changed, xs, axis=1), ys, axis=0)
+
+        written = 0
+        for row in np.flatnonzero(hits.any(axis=1)):
+            ty0 = y0 + row * tile
+            ty1 = min(ty0 + tile, y1)
+            # Edges of each run of changed tiles in this row
+            edges = np.flatnonzero(np.diff(np.concatenate(([0], hits[row].view(np.int8), [0]))))
+            for start, end in zip(edges[::2], edges[1::2]):
+                tx0 = x0 + start * tile
+                tx1 = min(x0 + end * tile, x1)
+                target[ty0:ty1, tx0:tx1] = frame[ty0:ty1, tx0:tx1]
+                self.shadow[ty0:ty1, tx0:tx1] = frame[ty0:ty1, tx0:tx1]
+                self.rects.append((tx0, ty0, tx1, ty1))
+                written += (tx1 - tx0) * (ty1 - ty0) * 2
+        return written
+
+class RGB565Display:
+    """Landscape 320x172 screen on the NanoKVM's portrait 172x320 RGB565 panel.
+
+    Apps subclass it and either draw into an RGB565Canvas and call
+    _display_canvas, or hand a 320x172 PIL RGB image to _display_image.
+    Either way frames go through TileDiff, so only changed tiles reach the
+    framebuffer, and with page_flip=True through PageFlip as well.
+    """
+
+    PHYSICAL_WIDTH = 172
+    PHYSICAL_HEIGHT = 320
+    BPP = 16
+
+    def __init__(self, fb_device='/dev/fb0', diff=True, page_flip=False):
+        self.physical_width = self.PHYSICAL_WIDTH
+        self.physical_height = self.PHYSICAL_HEIGHT
+        self.bpp = self.BPP
+        self.fb_size = self.physical_width * self.physical_height * (self.bpp // 8)
+
+        self.fb_device = resolve_fb_device(fb_device)
+        self.fb_fd = open_fb(self.fb_device)
+        # Optional double buffering: draw into the hidden page, then pan to it
+        self.pages = PageFlip(self.fb_fd) if page_flip else None
+        if self.pages and not self.pages.supported:
+            self.pages = None
+        if self.pages:
+            self.fb_mmap = self.pages.fbmem
+            self.fb_array = self.pages.page(self.pages.back)
+        else:
+            self.fb_mmap = map_fb(self.fb_fd, self.fb_size)
+            self.fb_array = np.frombuffer(self.fb_mmap, dtype=np.uint16).reshape(
+                self.physical_height, self.physical_width)
+        # Landscape view of the same memory: fb_logical[y, x] is logical pixel (x, y)
+        self.fb_logical = np.rot90(self.fb_array, -1)
+        # Working buffers for _display_image, allocated once
+        self._rgb565 = np.empty((self.physical_width, self.physical_height), dtype=np.uint16)
+        self._channel = np.empty_like(self._rgb565)
+        # PIL keeps RGB pixels 4 bytes wide, so an RGBX image over this array
+        # receives a frame with a plain copy and no intermediate bytes object
+        self._rgbx = np.empty((self.physical_width, self.physical_height, 4), dtype=np.uint8)
+        self._rgbx_image = Image.frombuffer('RGBX', (self.physical_height, self.physical_width),
+                                            self._rgbx, 'raw', 'RGBX', 0, 1)
+        # Shadow of the last submitted frame; only changed 16x16 tiles are written
+        self.tiles = TileDiff(self.physical_height, self.physical_width, enabled=diff)
+
+    def rgb_to_rgb565(self, r, g, b):
+        return ((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)
+
+    def clear_screen(self, color=0x0000):
+        self.fb_array.fill(color)
+        if self.pages:
+            self.pages.page(self.pages.front).fill(color)
+        self.tiles.reset(color)
+        for hook in frame_hooks:
+            hook(self)
+
+    def _display_image(self, logical_img):
+        """Convert a 320x172 RGB image (PIL image or (172, 320, 3) uint8 array) to
+        RGB565 and send the changed tiles to the screen."""
+        # Copy the pixels straight into the preallocated RGBX buffer; with
+        # the steps below, converting a frame allocates nothing
+        if isinstance(logical_img, Image.Image):
+            if logical_img.mode not in ('RGB', 'RGBA', 'RGBX'):
+                logical_img = logical_img.convert('RGB')
+            # The core paste skips the copy-on-write guard of Image.paste(), which
+            # would detach the image from self._rgbx
+            self._rgbx_image.im.paste(logical_img.im, (0, 0) + self._rgbx_image.size)
+        else:
+            np.copyto(self._rgbx[:, :, :3], np.asarray(logical_img)[:, :, :3])
+        rgb_array = self._rgbx
+        rgb565 = self._rgb565
+        channel = self._channel
+
+        np.right_shift(rgb_array[:, :, 0], 3, out=rgb565, dtype=np.uint16)
+        np.left_shift(rgb565, 11, out=rgb565)
+        np.right_shift(rgb_array[:, :, 1], 2, out=channel, dtype=np.uint16)
+        np.left_shift(channel, 5, out=channel)
+        np.bitwise_or(rgb565, channel, out=rgb565)
+        np.right_shift(rgb_array[:, :, 2], 3, out=channel, dtype=np.uint16)
+        np.bitwise_or(rgb565, channel, out=rgb565)
+
+        self.tiles.submit(rgb565, self.fb_logical)
+        self._present()
+
+    def _display_canvas(self, canvas):
+        """Send the changed tiles of an RGB565Canvas to the screen, no color conversion."""
+        dirty = canvas.take_dirty()
+        if dirty:
+            self.tiles.submit(canvas.pixels, self.fb_logical, dirty)
+            self._present()
+
+    def _present(self):
+        # In page-flip mode, show the hidden page that was just written
+        if self.pages and self.tiles.rects:
+            self.pages.flip()
+            self.fb_array = self.pages.page(self.pages.back)
+            self.fb_logical = np.rot90(self.fb_array, -1)
+            # The new hidden page is a frame behind; catch it up from the shadow
+            for x0, y0, x1, y1 in self.tiles.rects:
+                self.fb_logical[y0:y1, x0:x1] = self.tiles.shadow[y0:y1, x0:x1]
+        for hook in frame_hooks:
+            hook(self)
+
+    def snapshot(self):
+        """The image on screen as a (172, 320, 3) RGB array."""
+        # Outside a present the hidden page matches the visible one
+        return rgb565_to_rgb888(self.fb_logical)
+
+    def close(self):
+        if self.fb_mmap is None:
+            return
+        # numpy views keep the mmap exported, drop them before closing it
+        self.fb_logical = None
+        self.fb_array = None
+        if self.pages:
+            self.pages.close()
+        else:
+            self.fb_mmap.close()
+        self.fb_mmap = None
+        if self.fb_fd is not None:
+            os.close(self.fb_fd)
+            self.fb_fd = None
@@ -1,14 +1,8 @@
-import mmap
-import os
-import numpy as np
-from PIL import Image, ImageDraw, ImageFont
+from PIL import ImageFont
 import time
 import requests
-
-# Physical screen dimensions
-PHYSICAL_WIDTH = 172
-PHYSICAL_HEIGHT = 320
-BPP = 16
+from framebuffer import RGB565Canvas, RGB565Display as BaseDisplay
+from scheduler import Scheduler
 
 
 class CryptoChart:
@@ -161,34 +155,10 @@ class CryptoChart:
         return self.price_data.get(current_symbol)
 
 
-class RGB565Display:
-    def __init__(self, fb_device="/dev/fb0"):
-        self.physical_width = PHYSICAL_WIDTH
-        self.physical_height = PHYSICAL_HEIGHT
-        self.bpp = BPP
-        self.fb_size = self.physical_width * self.physical_height * (self.bpp // 8)
-
-        # Open framebuffer device
-        self.fb_fd = os.open(fb_device, os.O_RDWR)
-        self.fb_mmap = mmap.mmap(
-            self.fb_fd, self.fb_size, mmap.MAP_SHARED, mmap.PROT_WRITE
-        )
-        self.fb_array = np.frombuffer(self.fb_mmap, dtype=np.uint16).reshape(
-            (self.physical_height, self.physical_width)
-        )
-
-    def rgb_to_rgb565(self, r, g, b):
-        """Convert 8-bit RGB to RGB565 format"""
-        return ((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)
-
-    def clear_screen(self, color=0x0000):
-        """Clear screen with specified color"""
-        self.fb_array.fill(color)
-
+class RGB565Display(BaseDisplay):
     def draw_loading_screen(self, message="Fetching Data", current_symbol=None):
         """Display loading screen while fetching data"""
-        logical_img = Image.new("RGB", (320, 172), (15, 15, 30))  # Dark blue background
-        draw = ImageDraw.Draw(logical_img)
+        canvas = RGB565Canvas(320, 172, (15, 15, 30))  # Dark blue background
 
         try:
             font_large = ImageFont.truetype(
@@ -204,42 +174,37 @@ class RGB565Display:
             font_large = font_medium = font_small = ImageFont.load_default()
 
         # Draw loading message
-        text_width = draw.textlength(message, font=font_large)
+        text_width = font_large.getlength(message)
         text_x = (320 - text_width) // 2
-        draw.text((text_x, 60), message, fill=(100, 200, 255), font=font_large)
+        canvas.draw_text(text_x, 60, message, (100, 200, 255), font_large)
 
         # Draw current symbol if provided
         if current_symbol:
             symbol_text = f"Symbol: {current_symbol}"
-            symbol_width = draw.textlength(symbol_text, font=font_medium)
+            symbol_width = font_medium.getlength(symbol_text)
             symbol_x = (320 - symbol_width) // 2
-            draw.text(
-                (symbol_x, 90), symbol_text, fill=(200, 200, 200), font=font_medium
-            )
+            canvas.draw_text(symbol_x, 90, symbol_text, (200, 200, 200), font_medium)
 
         # Draw loading animation dots
         dot_time = int(time.time() * 2) % 4
         dots = "." * dot_time
-        dots_width = draw.textlength(dots, font=font_large)
+        dots_width = font_large.getlength(dots)
         dots_x = text_x + text_width + 5
-        draw.text((dots_x, 60), dots, fill=(100, 200, 255), font=font_large)
+        canvas.draw_text(dots_x, 60, dots, (100, 200, 255), font_large)
 
         # Draw info text
-        draw.text(
-            (80, 120), "Crypto Price Monitor", fill=(150, 150, 200), font=font_medium
-        )
-        draw.text((100, 140), "Auto-switch: 5s", fill=(120, 120, 160), font=font_small)
+        canvas.draw_text(80, 120, "Crypto Price Monitor", (150, 150, 200), font_medium)
+        canvas.draw_text(100, 140, "Auto-switch: 5s", (120, 120, 160), font_small)
 
-        self._display_image(logical_img)
+        self._display_canvas(canvas)
 
     def draw_candlestick_chart(self, chart_data, symbol_index=0, total_symbols=8):
         """Draw candlestick chart with price information"""
         if not chart_data or "ohlc" not in chart_data or len(chart_data["ohlc"]) == 0:
             return self.draw_error_message("No data available")
 
-        # Create logical size image (landscape 320x172)
-        logical_img = Image.new("RGB", (320, 172), (10, 10, 20))  # Dark blue background
-        draw = ImageDraw.Draw(logical_img)
+        # Create logical size RGB565 canvas (landscape 320x172)
+        canvas = RGB565Canvas(320, 172, (10, 10, 20))  # Dark blue background
 
         try:
             font_small = ImageFont.truetype(
@@ -287,16 +252,17 @@ class RGB565Display:
 
         # Draw chart title and info
         title_color = (255, 255, 255)
-        draw.text((10, 5), f"{symbol}/USD", fill=title_color, font=font_large)
+        canvas.draw_text(10, 5, f"{symbol}/USD", title_color, font_large)
 
         # Draw symbol counter
         counter_text = f"{symbol_index + 1}/{total_symbols}"
-        counter_width = draw.textlength(counter_text, font=font_small)
-        draw.text(
-            (320 - counter_width - 10, 5),
+        counter_width = font_small.getlength(counter_text)
+        canvas.draw_text(
+            320 - counter_width - 10,
+            5,
             counter_text,
-            fill=(150, 150, 200),
-            font=font_small,
+            (150, 150, 200),
+            font_small,
         )
 
         # Draw current price and change
@@ -304,17 +270,22 @@ class RGB565Display:
         price_text = f"${current_price:,.2f}"
         change_text = f"{change:+.2f} ({change_percent:+.1f}%)"
 
-        price_width = draw.textlength(price_text, font=font_medium)
-        draw.text(
-            (320 - price_width - 10, 25), price_text, fill=price_color, font=font_medium
+        price_width = font_medium.getlength(price_text)
+        canvas.draw_text(
+            320 - price_width - 10,
+            25,
+            price_text,
+            price_color,
+            font_medium,
         )
 
-        change_width = draw.textlength(change_text, font=font_small)
-        draw.text(
-            (320 - change_width - 10, 45),
+        change_width = font_small.getlength(change_text)
+        canvas.draw_text(
+            320 - change_width - 10,
+            45,
             change_text,
-            fill=price_color,
-            font=font_small,
+            price_color,
+            font_small,
         )
 
         # Draw price scale
@@ -323,10 +294,8 @@ class RGB565Display:
             price_val = min_price + (price_range * i / scale_steps)
             y_pos = chart_bottom - (chart_height * i / scale_steps)
             price_str = f"${price_val:,.0f}"
-            draw.text((5, y_pos - 6), price_str, fill=(150, 150, 150), font=font_small)
-            draw.line(
-                [(chart_left, y_pos), (chart_right, y_pos)], fill=(50, 50, 70), width=1
-            )
+            canvas.draw_text(5, y_pos - 6, price_str, (150, 150, 150), font_small)
+            canvas.draw_line(chart_left, y_pos, chart_right, y_pos, (50, 50, 70))
 
         # Draw candlesticks
         candle_count = len(ohlc_data)
@@ -358,9 +327,7 @@ class RGB565Display:
             candle_color = (0, 255, 100) if is_green else (255, 80, 80)
 
             # Draw high-low line
-            draw.line(
-                [(x_center, high_y), (x_center, low_y)], fill=candle_color, width=1
-            )
+            canvas.draw_line(x_center, high_y, x_center, low_y, candle_color)
 
             # Draw candle body
             body_top = min(open_y, close_y)
@@ -368,32 +335,24 @@ class RGB565Display:
             body_height = max(1, body_bottom - body_top)
 
             if body_height > 0:
-                draw.rectangle(
-                    [
-                        (x_center - candle_width // 2, body_top),
-                        (x_center + candle_width // 2, body_bottom),
-                    ],
-                    fill=candle_color,
+                canvas.draw_rect(
+                    x_center - candle_width // 2,
+                    body_top,
+                    candle_width // 2 * 2 + 1,
+                    body_bottom - body_top + 1,
+                    candle_color,
                 )
 
         # Draw footer info
-        draw.text(
-            (10, 150), "Data: CryptoCompare", fill=(180, 180, 180), font=font_small
-        )
-        draw.text(
-            (10, 160),
-            f"Switch: 5s | Update: 30s",
-            fill=(180, 180, 180),
-            font=font_small,
-        )
+        canvas.draw_text(10, 150, "Data: CryptoCompare", (180, 180, 180), font_small)
+        canvas.draw_text(10, 160, f"Switch: 5s | Update: 30s", (180, 180, 180), font_small)
 
         # Rotate and display
-        self._display_image(logical_img)
+        self._display_canvas(canvas)
 
     def draw_error_message(self, message):
         """Display error message"""
-        logical_img = Image.new("RGB", (320, 172), (20, 10, 10))  # Dark red background
-        draw = ImageDraw.Draw(logical_img)
+        canvas = RGB565Canvas(320, 172, (20, 10, 10))  # Dark red background
 
         try:
             font = ImageFont.truetype(
@@ -402,32 +361,12 @@ class RGB565Display:
         except:
             font = ImageFont.load_default()
 
-        text_width = draw.textlength(message, font=font)
+        text_width = font.getlength(message)
         text_x = (320 - text_width) // 2
-        draw.text((text_x, 80), message, fill=(255, 100, 100), font=font)
-        draw.text((120, 110), "Retrying...", fill=(200, 200, 200), font=font)
+        canvas.draw_text(text_x, 80, message, (255, 100, 100), font)
+        canvas.draw_text(120, 110, "Retrying...", (200, 200, 200), font)
 
-        self._display_image(logical_img)
-
-    def _display_image(self, logical_img):
-        """Rotate and display image on physical screen"""
-        # Rotate logical image 90 degrees counterclockwise
-        physical_img = logical_img.rotate(90, expand=True)
-
-        # Convert to RGB565
-        rgb_array = np.array(physical_img)
-        r = (rgb_array[:, :, 0] >> 3).astype(np.uint16)
-        g = (rgb_array[:, :, 1] >> 2).astype(np.uint16)
-        b = (rgb_array[:, :, 2] >> 3).astype(np.uint16)
-        rgb565 = (r << 11) | (g << 5) | b
-
-        # Copy to framebuffer
-        self.fb_array[:, :] = rgb565
-
-    def close(self):
-        """Close resources"""
-        self.fb_mmap.close()
-        os.close(self.fb_fd)
+        self._display_canvas(canvas)
 
 
 def main():
@@ -440,40 +379,36 @@ def main():
     print("Data update: 30 seconds")
     print("Data source: CryptoCompare API")
 
-    last_switch_time = time.time()
-    last_symbol_index = -1
-
-    try:
-        while True:
-            current_time = time.time()
-            current_symbol = chart.get_current_symbol()
+    def show_current_symbol():
+        current_symbol = chart.get_current_symbol()
 
-            # Show loading screen when switching to new symbol or fetching data
-            if chart.current_symbol_index != last_symbol_index:
-                # display.draw_loading_screen("Fetching Data", current_symbol)
-                last_symbol_index = chart.current_symbol_index
+        # Get current data
+        data = chart.get_current_data()
 
-            # Get current data
-            data = chart.get_current_data()
+        if data:
+            # Display chart
+            display.draw_candlestick_chart(
+                data, chart.current_symbol_index, len(chart.symbols)
+            )
+            print(f"Displaying {data['symbol']} - Price: ${data['price']:.2f}")
+        else:
+            display.draw_error_message(f"Failed: {current_symbol}")
+            print(f"Failed to fetch data for {current_symbol}")
 
-            if data:
-                # Display chart
-                display.draw_candlestick_chart(
-                    data, chart.current_symbol_index, len(chart.symbols)
-                )
-                print(f"Displaying {data['symbol']} - Price: ${data['price']:.2f}")
-            else:
-                display.draw_error_message(f"Failed: {current_symbol}")
-                print(f"Failed to fetch data for {current_symbol}")
+    def show_next_symbol():
+        next_symbol = chart.switch_to_next_symbol()
+        print(f"Switching to: {next_symbol}")
+        # display.draw_loading_screen("Fetching Data", next_symbol)
+        show_current_symbol()
 
-            # Switch to next symbol every 5 seconds
-            if current_time - last_switch_time >= chart.symbol_switch_interval:
-                next_symbol = chart.switch_to_next_symbol()
-                print(f"Switching to: {next_symbol}")
-                last_switch_time = current_time
+    try:
+        show_current_symbol()
 
-            # Wait before next update
-            time.sleep(0.5)  # Short sleep for responsive UI
+        # The chart only changes when the symbol switches (data is refreshed
+        # on the way), so sleep until then instead of redrawing every 0.5 s
+        scheduler = Scheduler()
+        scheduler.call_every(chart.symbol_switch_interval, show_next_symbol)
+        scheduler.run()
 
     except KeyboardInterrupt:
         print("\nChart display stopped")
@@ -0,0 +1,204 @@
+import os
+import time
+import heapq
+import select
+import threading
+from collections import deque
+from typing import Any, Callable, Optional, Tuple
+
+# Deadline scheduler for app main loops. Instead of waking every 50 ms to see
+# whether anything is due, an app registers one-shot and periodic timers and
+# sleeps (or waits on its InputHub) exactly until the earliest deadline.
+#
+#     scheduler = Scheduler()
+#     scheduler.call_every(1.0, update_clock)
+#     while True:
+#         source, event = scheduler.wait(hub) or (None, None)
+#
+# Timers live in a heap keyed on time.monotonic() deadlines; an app only has
+# a handful of them, so a heap is cheaper than a timer wheel here.
+
+
+class Timer:
+    """Handle returned by the call_* methods; cancel() stops it from running again."""
+
+    __slots__ = ('deadline', 'interval', 'callback', 'args', 'cancelled')
+
+    def __init__(self, deadline: float, interval: Optional[float], callback: Callable, args: tuple):
+        self.deadline = deadline
+        # None for one-shot timers
+        self.interval = interval
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler:
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._heap = []
+        # Tie-breaker so timers with equal deadlines run in the order they were added
+        self._seq = 0
+        self._running = False
+        # Callbacks handed over by other threads, see call_soon_threadsafe()
+        self._pending = deque()
+        self._wake_r = None
+        self._wake_w = None
+        self._wake_lock = threading.Lock()
+        self._hub = None
+        self._closed = False
+
+    def _push(self, timer: Timer) -> Timer:
+        heapq.heappush(self._heap, (timer.deadline, self._seq, timer))
+        self._seq += 1
+        return timer
+
+    def call_at(self, deadline: float, callback: Callable, *args) -> Timer:
+        """Run callback(*args) once at the clock time deadline."""
+        return self._push(Timer(deadline, None, callback, args))
+
+    def call_later(self, delay: float, callback: Callable, *args) -> Timer:
+        """Run callback(*args) once, delay seconds from now."""
+        return self.call_at(self.clock() + delay, callback, *args)
+
+    def call_every(self, interval: float, callback: Callable, *args,
+                   delay: Optional[float] = None) -> Timer:
+        """Run callback(*args) every interval seconds, first after delay (default: interval).
+
+        Ticks keep a fixed rate rather than drifting by the callback's run
+        time; ticks missed while the app was busy are skipped, not bunched up.
+        """
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        first = interval if delay is None else delay
+        return self._push(Timer(self.clock() + first, interval, callback, args))
+
+    def call_soon_threadsafe(self, callback: Callable, *args):
+        """Run callback(*args) on the scheduler's thread at its next wait(), sleep() or run_due()."""
+        self._pending.append((callback, args))
+        self.wakeup()
+
+    def _wakeup_fd(self) -> int:
+        with self._wake_lock:
+            return self._open_wakeup_pipe()
+
+    def _open_wakeup_pipe(self) -> int:
+        if self._wake_r is None:
+            self._wake_r, self._wake_w = os.pipe()
+            os.set_blocking(self._wake_r, False)
+            os.set_blocking(self._wake_w, False)
+        return self._wake_r
+
+    def wakeup(self):
+        """Interrupt a wait() or sleep() from another thread."""
+        with self._wake_lock:
+            # A worker thread can outlive the loop that owned the scheduler
+            if self._closed:
+                return
+            self._open_wakeup_pipe()
+            try:
+                os.write(self._wake_w, b'\0')
+            except BlockingIOError:
+                # The pipe is full, so a wakeup is already pending
+                pass
+
+    def _drain_wakeups(self):
+        try:
+            while os.read(self._wake_r, 64):
+                pass
+        except BlockingIOError:
+            pass
+
+    def next_deadline(self) -> Optional[float]:
+        """The earliest pending deadline, or None without timers."""
+        heap = self._heap
+        while heap and heap[0][2].cancelled:
+            heapq.heappop(heap)
+        if self._pending:
+            return self.clock()
+        return heap[0][0] if heap else None
+
+    def timeout(self) -> Optional[float]:
+        """Seconds until the next deadline (0 when overdue), or None without timers."""
+        deadline = self.next_deadline()
+        return None if deadline is None else max(0.0, deadline - self.clock())
+
+    def run_due(self) -> int:
+        """Run the callbacks that are due; returns how many ran."""
+        count = 0
+        while self._pending:
+            callback, args = self._pending.popleft()
+            callback(*args)
+            count += 1
+
+        now = self.clock()
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, _, timer = heapq.heappop(heap)
+            if timer.cancelled:
+                continue
+            if timer.interval is not None:
+                missed = int((now - timer.deadline) // timer.interval)
+                timer.deadline += (missed + 1) * timer.interval
+                self._push(timer)
+            timer.callback(*timer.args)
+            count += 1
+        return count
+
+    def sleep(self) -> int:
+        """Sleep until the next deadline (or a wakeup), then run what is due.
+
+        Without timers this blocks until another thread calls wakeup().
+        """
+        # Opened up front, so a wakeup() sent while we block is not missed
+        wake_r = self._wakeup_fd()
+        if select.select([wake_r], [], [], self.timeout())[0]:
+            self._drain_wakeups()
+        return self.run_due()
+
+    def wait(self, hub) -> Optional[Tuple[Any, Any]]:
+        """Wait on an InputHub until its next event or the next deadline.
+
+        Due timers run before returning. Returns the hub's (source, event),
+        or None when the wait ended for a timer or a wakeup().
+        """
+        if self._hub is not hub:
+            hub.add(self._wakeup_fd())
+            self._hub = hub
+        item = hub.read_event(deadline=self.next_deadline())
+        if item is not None and item[0] is self._wake_r:
+            self._drain_wakeups()
+            item = None
+        self.run_due()
+        return item
+
+    def run(self):
+        """Sleep and run timers until stop() is called."""
+        self._running = True
+        while self._running:
+            self.sleep()
+
+    def stop(self):
+        self._running = False
+
+    def close(self):
+        with self._wake_lock:
+            self._closed = True
+            if self._wake_r is None:
+                return
+            if self._hub is not None:
+                self._hub.remove(self._wake_r)
+                self._hub = None
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            self._wake_r = self._wake_w = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
@@ -1,13 +1,11 @@
-import mmap
-import os
 import numpy as np
-from PIL import Image, ImageDraw, ImageFont
+from PIL import ImageFont
 import time
+from framebuffer import RGB565Canvas, RGB565Display as BaseDisplay
+from scheduler import Scheduler
 
-# Physical screen dimensions
-PHYSICAL_WIDTH = 172
-PHYSICAL_HEIGHT = 320
-BPP = 16
+# Animation speed: one generation per frame
+FRAME_INTERVAL = 0.05
 
 
 class GameOfLife:
@@ -116,35 +114,16 @@ class GameOfLife:
         }
 
 
-class RGB565Display:
-    def __init__(self, fb_device="/dev/fb0"):
-        self.physical_width = PHYSICAL_WIDTH
-        self.physical_height = PHYSICAL_HEIGHT
-        self.bpp = BPP
-        self.fb_size = self.physical_width * self.physical_height * (self.bpp // 8)
-
-        # Open framebuffer device
-        self.fb_fd = os.open(fb_device, os.O_RDWR)
-        self.fb_mmap = mmap.mmap(
-            self.fb_fd, self.fb_size, mmap.MAP_SHARED, mmap.PROT_WRITE
-        )
-        self.fb_array = np.frombuffer(self.fb_mmap, dtype=np.uint16).reshape(
-            (self.physical_height, self.physical_width)
-        )
-
-    def rgb_to_rgb565(self, r, g, b):
-        """Convert 8-bit RGB to RGB565 format"""
-        return ((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)
-
-    def clear_screen(self, color=0x0000):
-        """Clear screen with specified color"""
-        self.fb_array.fill(color)
+class RGB565Display(BaseDisplay):
+    def __init__(self, fb_device="/dev/fb0", diff=True, page_flip=False):
+        super().__init__(fb_device, diff, page_flip)
+        # Frames are drawn straight in RGB565, see draw_game_frame
+        self.canvas = RGB565Canvas()
 
     def draw_game_frame(self, game, current_pattern, show_info=True):
-        """Draw current game frame with rotation"""
-        # Create logical size image (landscape 320x172)
-        logical_img = Image.new("RGB", (320, 172), (0, 0, 0))
-        draw = ImageDraw.Draw(logical_img)
+        """Draw current game frame into the RGB565 canvas"""
+        canvas = self.canvas
+        canvas.fill_screen((0, 0, 0))
 
         # Calculate cell size and position for centering
         cell_size = 3
@@ -155,26 +134,20 @@ class RGB565Display:
         grid_color = (20, 20, 40)  # Dark blue grid
         for i in range(game.height + 1):
             y = margin_y + i * cell_size
-            draw.line(
-                [(margin_x, y), (margin_x + game.width * cell_size, y)], fill=grid_color
-            )
+            canvas.draw_hline(margin_x, y, game.width * cell_size + 1, grid_color)
         for j in range(game.width + 1):
             x = margin_x + j * cell_size
-            draw.line(
-                [(x, margin_y), (x, margin_y + game.height * cell_size)],
-                fill=grid_color,
-            )
+            canvas.draw_vline(x, margin_y, game.height * cell_size + 1, grid_color)
 
-        # Draw live cells
+        # Draw live cells: view the grid area as (row, col, 3, 3) blocks and
+        # fill the inner 2x2 of every live block in one assignment
         live_color = (0, 255, 128)  # Cyan-green
-        for i in range(game.height):
-            for j in range(game.width):
-                if game.grid[i, j]:
-                    x1 = margin_x + j * cell_size + 1
-                    y1 = margin_y + i * cell_size + 1
-                    x2 = x1 + cell_size - 2
-                    y2 = y1 + cell_size - 2
-                    draw.rectangle([x1, y1, x2, y2], fill=live_color)
+        area = canvas.pixels[
+            margin_y:margin_y + game.height * cell_size,
+            margin_x:margin_x + game.width * cell_size,
+        ]
+        cells = area.reshape(game.height, cell_size, game.width, cell_size).transpose(0, 2, 1, 3)
+        cells[game.grid, 1:cell_size, 1:cell_size] = canvas.pack_color(live_color)
 
         # Display information text
         if show_info:
@@ -196,29 +169,13 @@ class RGB565Display:
             ]
 
             for idx, text in enumerate(info_text):
-                draw.text((10, 10 + idx * 15), text, fill=info_color, font=font_small)
+                canvas.draw_text(10, 10 + idx * 15, text, info_color, font_small)
 
-        # Rotate logical image 90 degrees counterclockwise for physical display
-        physical_img = logical_img.rotate(90, expand=True)
-
-        # Convert to RGB565 and copy to framebuffer
-        rgb_array = np.array(physical_img)
-        r = (rgb_array[:, :, 0] >> 3).astype(np.uint16)
-        g = (rgb_array[:, :, 1] >> 2).astype(np.uint16)
-        b = (rgb_array[:, :, 2] >> 3).astype(np.uint16)
-        rgb565 = (r << 11) | (g << 5) | b
-
-        # Direct array copy (fastest method)
-        self.fb_array[:, :] = rgb565
-
-    def close(self):
-        """Close resources"""
-        self.fb_mmap.close()
-        os.close(self.fb_fd)
+        self._display_canvas(canvas)
 
 
 def main():
-    display = RGB565Display()
+    display = RGB565Display(page_flip=True)
     game = GameOfLife()
 
     # Available patterns
@@ -253,7 +210,10 @@ def main():
         frame_count = 0
         last_time = time.time()
 
-        while True:
+        def step():
+            nonlocal current_pattern_index, current_pattern, pattern_display_name
+            nonlocal frame_count, last_time
+
             # Switch pattern every 100 generations
             if game.generation % 100 == 0 and game.generation > 0:
                 current_pattern_index = (current_pattern_index + 1) % len(pattern_names)
@@ -292,8 +252,10 @@ def main():
                 last_time = current_time
                 print(f"Generation: {game.generation}, FPS: {fps:.1f}")
 
-            # Control animation speed
-            time.sleep(0.05)
+        # Fixed-rate frames, so drawing time no longer slows the animation
+        scheduler = Scheduler()
+        scheduler.call_every(FRAME_INTERVAL, step, delay=0)
+        scheduler.run()
 
     except KeyboardInterrupt:
         print("\nGame Ended")
@@ -1,41 +1,12 @@
-import mmap
-import os
-import numpy as np
-from PIL import Image, ImageDraw, ImageFont
+from PIL import ImageFont
+from framebuffer import RGB565Canvas, RGB565Display as BaseDisplay
 
-# 物理屏幕尺寸
-PHYSICAL_WIDTH = 172
-PHYSICAL_HEIGHT = 320
-BPP = 16
-
-
-class RGB565Display:
-    def __init__(self, fb_device="/dev/fb0"):
-        self.physical_width = PHYSICAL_WIDTH
-        self.physical_height = PHYSICAL_HEIGHT
-        self.bpp = BPP
-        self.fb_size = self.physical_width * self.physical_height * (self.bpp // 8)
-
-        # 打开framebuffer设备
-        self.fb_fd = os.open(fb_device, os.O_RDWR)
-        self.fb_mmap = mmap.mmap(
-            self.fb_fd, self.fb_size, mmap.MAP_SHARED, mmap.PROT_WRITE
-        )
-        self.fb_array = np.frombuffer(self.fb_mmap, dtype=np.uint16).reshape(
-            (self.physical_height, self.physical_width)
-        )
-
-    def rgb_to_rgb565(self, r, g, b):
-        return ((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)
-
-    def clear_screen(self, color=0x0000):
-        self.fb_array.fill(color)
 
+class RGB565Display(BaseDisplay):
     def draw_rotated_content(self):
-        """直接在物理屏幕上绘制旋转后的内容"""
-        # 创建一个临时的逻辑尺寸图像（横屏320x172）
-        logical_img = Image.new("RGB", (320, 172), (0, 0, 0))
-        draw = ImageDraw.Draw(logical_img)
+        """直接在RGB565画布上绘制横屏内容"""
+        # 逻辑尺寸画布（横屏320x172），像素直接以RGB565保存
+        canvas = RGB565Canvas(320, 172, (0, 0, 0))
 
         # 加载字体
         try:
@@ -60,35 +31,18 @@ class RGB565Display:
         colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255)]
         for i, color in enumerate(colors):
             x = start_x + i * (block_size + spacing)
-            draw.rectangle(
-                [x, y_blocks, x + block_size, y_blocks + block_size], fill=color
-            )
+            canvas.draw_rect(x, y_blocks, block_size + 1, block_size + 1, color)
 
         # 2. 绘制居中文字
         text = "Hello World"
-        bbox = draw.textbbox((0, 0), text, font=font)
+        bbox = font.getbbox(text)
         text_width = bbox[2] - bbox[0]
         text_height = bbox[3] - bbox[1]
         x_text = (320 - text_width) // 2
         y_text = (172 - text_height) // 2
-        draw.text((x_text, y_text), text, fill=(255, 255, 255), font=font)
-
-        # 3. 将逻辑图像逆时针旋转90度得到物理图像
-        physical_img = logical_img.rotate(90, expand=True)
-
-        # 4. 转换为RGB565并直接复制到framebuffer
-        rgb_array = np.array(physical_img)
-        r = (rgb_array[:, :, 0] >> 3).astype(np.uint16)
-        g = (rgb_array[:, :, 1] >> 2).astype(np.uint16)
-        b = (rgb_array[:, :, 2] >> 3).astype(np.uint16)
-        rgb565 = (r << 11) | (g << 5) | b
-
-        # 直接复制整个数组（最快的方法）
-        self.fb_array[:, :] = rgb565
+        canvas.draw_text(x_text, y_text, text, (255, 255, 255), font)
 
-    def close(self):
-        self.fb_mmap.close()
-        os.close(self.fb_fd)
+        self._display_canvas(canvas)
 
 
 def main():
@@ -99,10 +53,10 @@ def main():
         display.draw_rotated_content()
         print("绘制完成！")
 
-        import time
+        import signal
 
-        while True:
-            time.sleep(1)
+        # Nothing left to update: block until Ctrl+C instead of waking every second
+        signal.pause()
     except KeyboardInterrupt:
         print("\n退出")
     finally:
@@ -2,30 +2,35 @@
 
 from framebuffer import Framebuffer
 from samba import SambaController, SambaUI, SambaInstaller, COLOR_BLUE, COLOR_RED, COLOR_GREEN, COLOR_WHITE
-from input import TouchScreen, GpioKeys
+from input import TouchScreen, TouchMapper, GpioKeys, InputHub
+from scheduler import Scheduler
 import time
 import threading
 
-def toggle_samba_service(ui: SambaUI, running: bool) -> bool:
+def show_status(ui: SambaUI, text: str, color):
+    ui.draw_status(text, color)
+    ui.fb.swap_buffer()
+
+# The workers below run in a thread and only draw through post(), which hands
+# the call to the main loop (Scheduler.call_soon_threadsafe)
+
+def toggle_samba_service(ui: SambaUI, running: bool, post) -> bool:
     controller = SambaController()
 
     if running:
         print("Stopping Samba...")
-        ui.draw_status("Stopping...", COLOR_BLUE)
-        ui.fb.swap_buffer()
+        post(show_status, ui, "Stopping...", COLOR_BLUE)
 
         if controller.stop():
             print("Samba stopped")
             return False
         else:
-            ui.draw_status("Stop Failed", COLOR_RED)
-            ui.fb.swap_buffer()
+            post(show_status, ui, "Stop Failed", COLOR_RED)
             time.sleep(2)
             return running
     else:
         print("Starting Samba...")
-        ui.draw_status("Starting...", COLOR_BLUE)
-        ui.fb.swap_buffer()
+        post(show_status, ui, "Starting...", COLOR_BLUE)
 
         if controller.start():
             print("Samba started")
@@ -33,17 +38,15 @@ def toggle_samba_service(ui: SambaUI, running: bool) -> bool:
             print(f"Access via: {ip_address}")
             return True
         else:
-            ui.draw_status("Start Failed", COLOR_RED)
-            ui.fb.swap_buffer()
+            post(show_status, ui, "Start Failed", COLOR_RED)
             time.sleep(2)
             return running
 
-def install_samba_package(fb: Framebuffer, ui: SambaUI) -> bool:
+def install_samba_package(fb: Framebuffer, ui: SambaUI, post) -> bool:
     print("Installing Samba...")
-    ui.draw_status("Installing...", COLOR_BLUE)
-    ui.fb.swap_buffer()
+    post(show_status, ui, "Installing...", COLOR_BLUE)
 
-    installer = SambaInstaller(fb)
+    installer = SambaInstaller(fb, post=post)
     success = installer.install_samba()
 
     if success:
@@ -51,7 +54,7 @@ def install_samba_package(fb: Framebuffer, ui: SambaUI) -> bool:
         return True
     else:
         print("Samba installation failed")
-        ui.draw_install_ui()
+        post(ui.draw_install_ui)
         return False
 
 def run_control_mode(fb: Framebuffer):
@@ -61,28 +64,38 @@ def run_control_mode(fb: Framebuffer):
     ip_address = controller.get_ip_address() if running else None
     ui.draw_control_ui(running, ip_address)
     operation_lock = threading.Lock()
+    scheduler = Scheduler()
 
-    def toggle_in_thread(current_running):
+    def toggle_done(new_running):
         nonlocal running, ip_address
-        new_running = toggle_samba_service(ui, current_running)
-        if new_running != current_running:
+        if new_running != running:
             running = new_running
             ip_address = controller.get_ip_address() if running else None
         ui.update_control_status(running, ip_address)
         operation_lock.release()
 
+    def toggle_in_thread(current_running):
+        new_running = toggle_samba_service(ui, current_running, scheduler.call_soon_threadsafe)
+        scheduler.call_soon_threadsafe(toggle_done, new_running)
+
     try:
-        with TouchScreen() as touch, GpioKeys() as keys:
+        with TouchScreen(coalesce_moves=True) as touch, GpioKeys() as keys, InputHub() as hub:
+            hub.add(touch)
+            hub.add(keys)
+            mapper = TouchMapper.for_device(touch, rotation=fb.rotation)
             print("Samba Control started")
             print(f"Current status: {'Run' if running else 'Stop'}")
             if running:
                 print(f"Access via: {ip_address}")
 
             while True:
-                touch_event = touch.read_event(timeout=0.01)
+                # Also wakes for the UI updates posted by the toggle thread
+                source, event = scheduler.wait(hub) or (None, None)
+
+                touch_event = event if source is touch else None
                 if touch_event:
                     event_type, x, y, touching = touch_event
-                    screen_x, screen_y = TouchScreen.map_coords_270(x, y)
+                    screen_x, screen_y = mapper.map(x, y)
 
                     if event_type == 'touch_down':
                         if ui.is_exit_button_pressed(screen_x, screen_y):
@@ -104,7 +117,7 @@ def run_control_mode(fb: Framebuffer):
                         if ui.is_exit_button_pressed(screen_x, screen_y):
                             break
 
-                key_event = keys.read_event(timeout=0.01)
+                key_event = event if source is keys else None
                 if key_event:
                     event_type, key_name, pressed, duration, is_long_press = key_event
 
@@ -122,6 +135,7 @@ def run_control_mode(fb: Framebuffer):
     except KeyboardInterrupt:
         print("\nInterrupted by user")
     finally:
+        scheduler.close()
         fb.fill_screen((0, 0, 0))
 
 def run_install_mode(fb: Framebuffer) -> bool:
@@ -131,19 +145,29 @@ def run_install_mode(fb: Framebuffer) -> bool:
     operation_lock = threading.Lock()
     should_exit = [False]
     user_cancelled = [False]
+    scheduler = Scheduler()
 
-    def install_in_thread():
-        success = install_samba_package(fb, ui)
+    def install_done(success):
         should_exit[0] = success
         operation_lock.release()
 
+    def install_in_thread():
+        success = install_samba_package(fb, ui, scheduler.call_soon_threadsafe)
+        scheduler.call_soon_threadsafe(install_done, success)
+
     try:
-        with TouchScreen() as touch, GpioKeys() as keys:
+        with TouchScreen(coalesce_moves=True) as touch, GpioKeys() as keys, InputHub() as hub:
+            hub.add(touch)
+            hub.add(keys)
+            mapper = TouchMapper.for_device(touch, rotation=fb.rotation)
             while True:
-                touch_event = touch.read_event(timeout=0.01)
+                # The install thread posts its progress and result to this loop
+                source, event = scheduler.wait(hub) or (None, None)
+
+                touch_event = event if source is touch else None
                 if touch_event:
                     event_type, x, y, touching = touch_event
-                    screen_x, screen_y = TouchScreen.map_coords_270(x, y)
+                    screen_x, screen_y = mapper.map(x, y)
 
                     if event_type == 'touch_down':
                         if ui.is_exit_button_pressed(screen_x, screen_y):
@@ -168,7 +192,7 @@ def run_install_mode(fb: Framebuffer) -> bool:
                 if should_exit[0]:
                     break
 
-                key_event = keys.read_event(timeout=0.01)
+                key_event = event if source is keys else None
                 if key_event:
                     event_type, key_name, pressed, duration, is_long_press = key_event
 
@@ -188,6 +212,7 @@ def run_install_mode(fb: Framebuffer) -> bool:
         print("\nInterrupted by user")
         user_cancelled[0] = True
     finally:
+        scheduler.close()
         fb.fill_screen((0, 0, 0))
 
     return not user_cancelled[0]
@@ -222,8 +222,11 @@ class SambaInstaller:
     COLOR_PROGRESS_FILL = (59, 130, 246)
     COLOR_PROGRESS_BORDER = (80, 80, 80)
 
-    def __init__(self, fb):
+    def __init__(self, fb, post=None):
         self.fb = fb
+        # install_samba() runs in a thread; post(func, *args) runs the drawing
+        # on the main loop instead
+        self.post = post
         self.progress_bar_height = 22
         self.progress_bar_margin = 20
         self.last_message = ""
@@ -245,6 +248,12 @@ class SambaInstaller:
 
         print(f"{message} {progress}%")
 
+        if self.post:
+            self.post(self._draw_progress, message, progress, color)
+        else:
+            self._draw_progress(message, progress, color)
+
+    def _draw_progress(self, message, progress, color):
         if message != self.last_message:
             self.clear_screen()
 
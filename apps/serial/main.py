@@ -1,23 +1,44 @@
 #!/usr/bin/env python3
 
+import time
 from framebuffer import Framebuffer
-from input import TouchScreen, GpioKeys, RotaryEncoder
+from input import TouchScreen, TouchMapper, GpioKeys, RotaryEncoder, InputHub
 from uart import UartUI, check_and_fix_serial_module
 
+# Serial data now wakes the loop, so cap how often the terminal is redrawn
+TERMINAL_FRAME_INTERVAL = 1 / 30
+
 def run_uart_mode(fb: Framebuffer):
     ui = UartUI(fb)
     ui.draw_ui()
     pressed_button = None
 
     try:
-        with TouchScreen() as touch, GpioKeys() as keys, RotaryEncoder() as rotary:
+        with TouchScreen(coalesce_moves=True) as touch, GpioKeys() as keys, RotaryEncoder(acceleration=RotaryEncoder.ACCELERATION) as rotary, InputHub() as hub:
+            for device in (touch, keys, rotary):
+                hub.add(device)
+            mapper = TouchMapper.for_device(touch, rotation=fb.rotation)
+            serial_port = None
+            next_flush = 0.0
             print(f"UART Console - Selected: UART{ui.get_uart()}, Baud: {ui.get_baud_rate()}")
 
             while True:
-                touch_event = touch.read_event(timeout=0.01)
+                # Serial data wakes the loop too while a port is open
+                if ui.serial_port is not serial_port:
+                    if serial_port:
+                        hub.remove(serial_port)
+                    serial_port = ui.serial_port
+                    if serial_port:
+                        hub.add(serial_port)
+
+                # Only the terminal flushes, so only it needs the deadline
+                deadline = next_flush if ui.terminal_mode and ui.update_pending else None
+                source, event = hub.read_event(deadline=deadline) or (None, None)
+
+                touch_event = event if source is touch else None
                 if touch_event:
                     event_type, x, y, touching = touch_event
-                    screen_x, screen_y = TouchScreen.map_coords_270(x, y)
+                    screen_x, screen_y = mapper.map(x, y)
 
                     if event_type == 'touch_down':
                         if ui.terminal_mode:
@@ -89,7 +110,7 @@ def run_uart_mode(fb: Framebuffer):
                                 ui.set_uart(2)
                                 print(f"Selected: UART2, Baud: {ui.get_baud_rate()}")
 
-                key_event = keys.read_event(timeout=0.01)
+                key_event = event if source is keys else None
                 if key_event:
                     event_type, key_name, pressed, duration, is_long_press = key_event
 
@@ -109,20 +130,18 @@ def run_uart_mode(fb: Framebuffer):
                             else:
                                 print(f"UART{ui.get_uart()} closed")
 
-                rotary_direction = rotary.read_event(timeout=0.01)
+                rotary_direction = event if source is rotary else None
                 if rotary_direction and not ui.terminal_mode:
-                    if rotary_direction > 0:
-                        if ui.baud_rate_next():
-                            print(f"Rotary CW: Baud: {ui.get_baud_rate()}")
-                    else:
-                        if ui.baud_rate_prev():
-                            print(f"Rotary CCW: Baud: {ui.get_baud_rate()}")
+                    # Fast spins report several steps per click
+                    if ui.baud_rate_step(rotary_direction):
+                        print(f"Rotary {'CW' if rotary_direction > 0 else 'CCW'}: Baud: {ui.get_baud_rate()}")
 
                 if ui.get_open_status():
                     ui.read_serial_data()
 
-                if ui.terminal_mode:
+                if ui.terminal_mode and ui.update_pending and time.monotonic() >= next_flush:
                     ui.flush_terminal_update()
+                    next_flush = time.monotonic() + TERMINAL_FRAME_INTERVAL
 
     except KeyboardInterrupt:
         print("\nInterrupted by user")
@@ -400,6 +400,15 @@ class UartUI:
             return True
         return False
 
+    def baud_rate_step(self, steps: int):
+        index = max(0, min(len(self.baud_rates) - 1, self.selected_baud_index + steps))
+        if index != self.selected_baud_index:
+            self.selected_baud_index = index
+            self.draw_baud_buttons()
+            self.fb.swap_buffer()
+            return True
+        return False
+
     def get_baud_button_at(self, x: int, y: int) -> int:
         return None
 
@@ -459,6 +468,8 @@ class UartUI:
         self.serial_port = None
         self.is_opened = False
         self.terminal_mode = False
+        # Nothing left to flush; a stale flag would keep the flush deadline armed
+        self.update_pending = False
 
         if self.terminal_font_path:
             self.fb.set_font(self.original_font_path, self.original_font_size)
@@ -1,33 +1,26 @@
-import mmap
-import os
 import numpy as np
-from PIL import Image, ImageDraw, ImageFont
+from PIL import ImageFont
 import time
 import math
-
-# Physical screen dimensions
-PHYSICAL_WIDTH = 172
-PHYSICAL_HEIGHT = 320
-BPP = 16
+from framebuffer import RGB565Canvas, RGB565Display as BaseDisplay
+from scheduler import Scheduler
 
 # Maximum wave height
 WAVE_MAX_HEIGHT = 10
 
-class RGB565Display:
-    def __init__(self, fb_device="/dev/fb0"):
-        self.physical_width = PHYSICAL_WIDTH
-        self.physical_height = PHYSICAL_HEIGHT
-        self.bpp = BPP
-        self.fb_size = self.physical_width * self.physical_height * (self.bpp // 8)
+# The wave moves every frame; the console status only changes once a second
+FRAME_INTERVAL = 0.05
+STATUS_INTERVAL = 1.0
+
 
-        # Open framebuffer device
-        self.fb_fd = os.open(fb_device, os.O_RDWR)
-        self.fb_mmap = mmap.mmap(
-            self.fb_fd, self.fb_size, mmap.MAP_SHARED, mmap.PROT_WRITE
-        )
-        self.fb_array = np.frombuffer(self.fb_mmap, dtype=np.uint16).reshape(
-            (self.physical_height, self.physical_width)
-        )
+class RGB565Display(BaseDisplay):
+    def __init__(self, fb_device="/dev/fb0", diff=True, page_flip=False):
+        super().__init__(fb_device, diff, page_flip)
+        # Frames are drawn straight in RGB565, see draw_wave_pattern
+        self.canvas = RGB565Canvas()
+        self._rows = np.arange(172)[:, None]
+        # One extra column for the right end of the wave contour
+        self._columns = np.arange(321)
         
         # Load fonts
         self._load_fonts()
@@ -57,12 +50,6 @@ class RGB565Display:
                 self.font_timer = ImageFont.load_default()
                 self.font_status = ImageFont.load_default()
 
-    def rgb_to_rgb565(self, r, g, b):
-        return ((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)
-
-    def clear_screen(self, color=0x0000):
-        self.fb_array.fill(color)
-
     def format_time(self, seconds):
         """Format time as MM:SS"""
         minutes = seconds // 60
@@ -75,9 +62,9 @@ class RGB565Display:
         progress: progress value between 0-1
         is_work: True for work mode (red), False for rest mode (green)
         """
-        # Create logical size image (landscape 320x172)
-        logical_img = Image.new("RGB", (320, 172), (0, 0, 0))  # Black background
-        draw = ImageDraw.Draw(logical_img)
+        # Logical size RGB565 canvas (landscape 320x172)
+        canvas = self.canvas
+        canvas.fill_screen((0, 0, 0))  # Black background
         
         # HSV color configuration
         if is_work:
@@ -151,114 +138,86 @@ class RGB565Display:
                 r, g, b = int(r * 255), int(g * 255), int(b * 255)
                 
                 # Draw this row
-                draw.line([(0, y), (320, y)], fill=(r, g, b))
+                canvas.draw_hline(0, y, 320, (r, g, b))
             
-            # 2. Calculate wave contour, create black mask to "erase" the part above the wave
-            wave_points = []
-            for x in range(0, 321, 2):
-                # Composite wave: two sine waves with different frequencies superimposed
-                wave1 = math.sin(x * 0.05 + self.wave_phase) * wave_amplitude
-                wave2 = math.sin(x * 0.03 + self.wave_phase * 1.3) * (wave_amplitude * 0.6)
-                wave_height = wave1 + wave2
-                
-                # Calculate wave surface y-coordinate (from top)
-                wave_y = 172 - total_liquid_height + int(wave_height)
-                wave_points.append((x, wave_y))
+            # 2. Calculate wave contour once: the mask and the highlights share it.
+            # Column 320 is included so the last highlight segment reaches the edge
+            columns = self._columns
+            # Composite wave: two sine waves with different frequencies superimposed
+            wave = (np.sin(columns * 0.05 + self.wave_phase) * wave_amplitude
+                    + np.sin(columns * 0.03 + self.wave_phase * 1.3) * (wave_amplitude * 0.6))
+            # Wave surface y-coordinate (from top)
+            wave_y = 172 - total_liquid_height + wave.astype(int)
             
-            # 3. Create black polygon to erase the part above the wave
-            erase_points = wave_points + [(320, 0), (0, 0)]
-            draw.polygon(erase_points, fill=(0, 0, 0))
+            # 3. Erase the part above the wave, column by column in one mask
+            canvas.pixels[self._rows <= wave_y[:320]] = 0
             
             # 4. Draw wave highlight lines
-            for i in range(len(wave_points) - 1):
-                x1, y1 = wave_points[i]
-                x2, y2 = wave_points[i + 1]
+            # Calculate HSV for highlight position
+            highlight_h = base_hue / 360.0
+            highlight_s = max(0, sat_range[0] - 0.2)  # Reduce saturation
+            highlight_v = min(1.0, val_range[0] + 0.2)  # Increase value
+            
+            # HSV to RGB
+            if highlight_s == 0.0:
+                hr, hg, hb = highlight_v, highlight_v, highlight_v
+            else:
+                highlight_h *= 6.0
+                hi = int(highlight_h)
+                hf = highlight_h - hi
+                hp = highlight_v * (1.0 - highlight_s)
+                hq = highlight_v * (1.0 - highlight_s * hf)
+                ht = highlight_v * (1.0 - highlight_s * (1.0 - hf))
                 
-                # Calculate wave slope
-                slope = y2 - y1
+                if hi == 0:
+                    hr, hg, hb = highlight_v, ht, hp
+                elif hi == 1:
+                    hr, hg, hb = hq, highlight_v, hp
+                elif hi == 2:
+                    hr, hg, hb = hp, highlight_v, ht
+                elif hi == 3:
+                    hr, hg, hb = hp, hq, highlight_v
+                elif hi == 4:
+                    hr, hg, hb = ht, hp, highlight_v
+                else:
+                    hr, hg, hb = highlight_v, hp, hq
+            
+            highlight_color = (int(hr * 255), int(hg * 255), int(hb * 255))
+            
+            # Every 2 px along the contour
+            points_y = wave_y[::2].tolist()
+            for i in range(len(points_y) - 1):
+                y1 = points_y[i]
+                y2 = points_y[i + 1]
                 
                 # Add highlight effect on wave surface (only on uphill parts)
-                if slope > 0:  # Uphill part
-                    # Calculate highlight strength
-                    highlight_strength = min(1.0, 0.3 + abs(slope) * 0.1)
-                    
-                    # Calculate HSV for highlight position
-                    highlight_h = base_hue / 360.0
-                    highlight_s = max(0, sat_range[0] - 0.2)  # Reduce saturation
-                    highlight_v = min(1.0, val_range[0] + 0.2)  # Increase value
-                    
-                    # HSV to RGB
-                    if highlight_s == 0.0:
-                        hr, hg, hb = highlight_v, highlight_v, highlight_v
-                    else:
-                        highlight_h *= 6.0
-                        hi = int(highlight_h)
-                        hf = highlight_h - hi
-                        hp = highlight_v * (1.0 - highlight_s)
-                        hq = highlight_v * (1.0 - highlight_s * hf)
-                        ht = highlight_v * (1.0 - highlight_s * (1.0 - hf))
-                        
-                        if hi == 0:
-                            hr, hg, hb = highlight_v, ht, hp
-                        elif hi == 1:
-                            hr, hg, hb = hq, highlight_v, hp
-                        elif hi == 2:
-                            hr, hg, hb = hp, highlight_v, ht
-                        elif hi == 3:
-                            hr, hg, hb = hp, hq, highlight_v
-                        elif hi == 4:
-                            hr, hg, hb = ht, hp, highlight_v
-                        else:
-                            hr, hg, hb = highlight_v, hp, hq
-                    
-                    hr, hg, hb = int(hr * 255), int(hg * 255), int(hb * 255)
-                    
-                    # Draw highlight line
-                    draw.line([(x1, y1), (x2, y2)], fill=(hr, hg, hb), width=2)
+                if y2 > y1:
+                    canvas.draw_line(i * 2, y1, i * 2 + 2, y2, highlight_color, width=2)
             # Draw liquid_top debug lines
-            # draw.line([(0, liquid_top), (320, liquid_top)], fill=(255, 255, 255), width=1)
-            # draw.line([(0, liquid_top2), (320, liquid_top2)], fill=(0, 0, 255), width=1)
+            # canvas.draw_hline(0, liquid_top, 320, (255, 255, 255))
+            # canvas.draw_hline(0, liquid_top2, 320, (0, 0, 255))
 
         # Draw countdown text
         timer_text = self.format_time(int(25 * 60 * (1-progress)) if is_work else int(5 * 60 * (1-progress)))
-        bbox = draw.textbbox((0, 0), timer_text, font=self.font_timer)
+        bbox = self.font_timer.getbbox(timer_text)
         text_width = bbox[2] - bbox[0]
         text_height = bbox[3] - bbox[1]
         x_text = (320 - text_width) // 2
         y_text = (172 - text_height) // 2 - 30
         
-        draw.text((x_text, y_text), timer_text, fill=(255, 255, 255), font=self.font_timer)
+        canvas.draw_text(x_text, y_text, timer_text, (255, 255, 255), self.font_timer)
 
         # Draw status text
         status_text = "Working..." if is_work else "Resting..."
-        bbox_status = draw.textbbox((0, 0), status_text, font=self.font_status)
+        bbox_status = self.font_status.getbbox(status_text)
         status_width = bbox_status[2] - bbox_status[0]
         x_status = (320 - status_width) // 2
         y_status = y_text + text_height + 25
         
-        draw.text((x_status, y_status), status_text, fill=(255, 255, 255), font=self.font_status)
-
-        # Convert to physical image and display
-        self._display_image(logical_img)
-
-    def _display_image(self, logical_img):
-        """Rotate logical image and display on physical screen"""
-        # Rotate logical image 90 degrees counterclockwise to get physical image
-        physical_img = logical_img.rotate(90, expand=True)
-
-        # Convert to RGB565 and copy to framebuffer
-        rgb_array = np.array(physical_img)
-        r = (rgb_array[:, :, 0] >> 3).astype(np.uint16)
-        g = (rgb_array[:, :, 1] >> 2).astype(np.uint16)
-        b = (rgb_array[:, :, 2] >> 3).astype(np.uint16)
-        rgb565 = (r << 11) | (g << 5) | b
-
-        # Directly copy entire array to framebuffer
-        self.fb_array[:, :] = rgb565
+        canvas.draw_text(x_status, y_status, status_text, (255, 255, 255), self.font_status)
 
-    def close(self):
-        self.fb_mmap.close()
-        os.close(self.fb_fd)
+        # Copy the RGB565 canvas to the screen
+        self._display_canvas(canvas)
 
 
 class PomodoroTimer:
@@ -272,10 +231,14 @@ class PomodoroTimer:
         self.current_time = self.work_time
         self.start_time = time.time()
         
+    def get_remaining(self):
+        """Seconds left in the current mode"""
+        elapsed = time.time() - self.start_time
+        return max(0, self.current_time - elapsed)
+
     def update(self):
         """Update timer status"""
-        elapsed = time.time() - self.start_time
-        remaining = max(0, self.current_time - elapsed)
+        remaining = self.get_remaining()
         
         if remaining <= 0:
             # Switch mode
@@ -306,7 +269,7 @@ class PomodoroTimer:
 
 def main():
     # Initialize display
-    display = RGB565Display()
+    display = RGB565Display(page_flip=True)
     
     try:
         # Create pomodoro timer
@@ -316,10 +279,8 @@ def main():
         print("Work: 25 minutes, Rest: 5 minutes")
         print("Press Ctrl+C to exit")
         
-        while True:
-            remaining = pomodoro.update()
-            
-            # Console output status
+        def print_status():
+            remaining = pomodoro.get_remaining()
             mode = pomodoro.get_current_mode()
             minutes = int(remaining) // 60
             seconds = int(remaining) % 60
@@ -327,9 +288,12 @@ def main():
             
             print(f"\r{mode} mode - Remaining: {minutes:02d}:{seconds:02d} - Progress: {progress*100:.1f}%", 
                   end="", flush=True)
-            
-            # Control refresh rate
-            time.sleep(0.05)
+        
+        # Sleep until the next frame or status line is due
+        scheduler = Scheduler()
+        scheduler.call_every(FRAME_INTERVAL, pomodoro.update, delay=0)
+        scheduler.call_every(STATUS_INTERVAL, print_status, delay=0)
+        scheduler.run()
             
     except KeyboardInterrupt:
         print("\n\nPomodoro timer stopped")
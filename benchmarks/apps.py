@@ -0,0 +1,437 @@
+import os
+import sys
+import json
+import time
+import pty
+import tty
+import runpy
+import signal
+import struct
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# End-to-end benchmark: runs whole apps on the headless framebuffer with fake
+# evdev devices (FIFOs), a pty in place of the UART and a local HTTP server in
+# place of the coin API, replays a scripted input timeline (or an input trace
+# recorded on the device) and reports frame times, CPU time and peak RSS. Each
+# app runs in its own child process so the resource numbers are per app.
+
+
+def get_path():
+    from pathlib import Path
+
+    curr_dir = Path(__file__).resolve().parent
+    return (curr_dir.parent / "apps", curr_dir.parent / "simulator")
+
+
+(APPS_DIR, SIMULATOR_DIR) = get_path()
+
+EVENT_FORMAT = 'llHHi'
+EV_SYN, EV_KEY, EV_REL, EV_ABS = 0x00, 0x01, 0x02, 0x03
+ABS_X, ABS_Y = 0x00, 0x01
+ABS_MT_POSITION_X, ABS_MT_POSITION_Y = 0x35, 0x36
+BTN_TOUCH = 0x14a
+REL_X = 0x00
+KEY_CODES = {'UP': 103, 'DOWN': 108, 'LEFT': 105, 'RIGHT': 106, 'ENTER': 28, 'ESC': 1}
+
+COIN_API = "https://min-api.cryptocompare.com"
+
+# Per app: fake input devices (by input.py class name), externals to stub,
+# the function called once per main-loop iteration (none for apps that draw
+# once and block, such as hello) and the input timeline.
+# Timeline steps are (seconds, device, action, *args) with taps and strokes in
+# logical 320x172 screen coordinates.
+PROFILES = {
+    "serial": {
+        "devices": ["TouchScreen", "GpioKeys", "RotaryEncoder"],
+        "externals": ["uart"],
+        "tick": ("input", "InputHub", "read_event"),
+        "baud": 921600,
+        "timeline": [
+            (0.5, "RotaryEncoder", "rotate", 1),    # 115200 -> 230400
+            (0.8, "RotaryEncoder", "rotate", 1),    # 230400 -> 921600
+            (1.2, "TouchScreen", "tap", 265, 90),   # Open
+        ],
+    },
+    "drawo": {
+        "devices": ["TouchScreen"],
+        "tick": ("input", "InputHub", "read_event"),
+        "timeline": [
+            (0.5, "TouchScreen", "stroke", 60, 60, 290, 140, 1.0),
+            (2.0, "TouchScreen", "stroke", 290, 60, 60, 140, 0.25),
+        ],
+    },
+    # Scheduler.sleep() waits in select() and then runs the due timers, so
+    # the select() is the wait and the timers are the work
+    "tomato": {"tick": ("select", None, "select")},
+    "conway": {"tick": ("select", None, "select")},
+    "hello": {},
+    "coin": {"externals": ["http"], "tick": ("select", None, "select")},
+}
+
+
+class FakeEvdev:
+    """A FIFO that the app opens as an input device; write() takes (type, code, value) events."""
+
+    def __init__(self, path):
+        self.path = path
+        os.mkfifo(path)
+        # Held read-write so the app's open() never blocks on a missing writer
+        self.fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+
+    def write(self, events):
+        now = time.time()
+        sec, usec = int(now), int((now % 1) * 1e6)
+        os.write(self.fd, b''.join(struct.pack(EVENT_FORMAT, sec, usec, *event) for event in events))
+
+    def close(self):
+        os.close(self.fd)
+
+
+def touch_position(x, y):
+    # Inverse of TouchScreen.map_coords_270
+    touch_x, touch_y = y, 319 - x
+    return [(EV_ABS, ABS_MT_POSITION_X, touch_x), (EV_ABS, ABS_MT_POSITION_Y, touch_y),
+            (EV_ABS, ABS_X, touch_x), (EV_ABS, ABS_Y, touch_y)]
+
+
+def expand_step(step):
+    """One timeline step -> [(seconds, device, events)] with the releases scheduled after the presses."""
+    t, device, action, *args = step
+    if action == "tap":
+        x, y = args
+        down = touch_position(x, y) + [(EV_KEY, BTN_TOUCH, 1), (EV_SYN, 0, 0)]
+        return [(t, device, down), (t + 0.05, device, [(EV_KEY, BTN_TOUCH, 0), (EV_SYN, 0, 0)])]
+    if action == "stroke":
+        # A straight drag with a report every 1/120 s
+        x0, y0, x1, y1, duration = args
+        reports = max(1, int(duration * 120))
+        steps = [(t, device, touch_position(x0, y0) + [(EV_KEY, BTN_TOUCH, 1), (EV_SYN, 0, 0)])]
+        for i in range(1, reports + 1):
+            x = x0 + (x1 - x0) * i // reports
+            y = y0 + (y1 - y0) * i // reports
+            steps.append((t + i / 120, device, touch_position(x, y) + [(EV_SYN, 0, 0)]))
+        steps.append((t + (reports + 1) / 120, device, [(EV_KEY, BTN_TOUCH, 0), (EV_SYN, 0, 0)]))
+        return steps
+    if action == "key":
+        code = KEY_CODES[args[0]]
+        hold = args[1] if len(args) > 1 else 0.1
+        return [(t, device, [(EV_KEY, code, 1), (EV_SYN, 0, 0)]),
+                (t + hold, device, [(EV_KEY, code, 0), (EV_SYN, 0, 0)])]
+    if action == "rotate":
+        # Two detents per click, see RotaryEncoder.steps_per_click
+        value = 1 if args[0] > 0 else -1
+        return [(t + i * 0.01, device, [(EV_REL, REL_X, value), (EV_SYN, 0, 0)]) for i in range(2 * abs(args[0]))]
+    raise ValueError(f"unknown timeline action: {action}")
+
+
+def replay(timeline, devices, start):
+    for t, device, events in sorted((e for step in timeline for e in expand_step(step)), key=lambda e: e[0]):
+        delay = start + t - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        devices[device].write(events)
+
+
+def feed_uart(master_fd, baud, start):
+    """Stream log-like lines into the pty at the line rate of the given baud (8N1)."""
+    bytes_per_s = baud / 10
+    sent = 0
+    line = 0
+    while True:
+        elapsed = time.monotonic() - start
+        due = int(elapsed * bytes_per_s) - sent
+        if due <= 0:
+            time.sleep(0.001)
+            continue
+        chunk = b''
+        while len(chunk) < due:
+            chunk += f"[{elapsed:12.6f}] line {line}: the quick brown fox jumps over the lazy dog\r\n".encode()
+            line += 1
+        try:
+            os.write(master_fd, chunk[:due])
+        except OSError:
+            return
+        sent += due
+
+
+def stub_uart(baud):
+    """Point the app's Serial at a pty that streams data at the given baud."""
+    import uart
+
+    master_fd, slave_fd = pty.openpty()
+    tty.setraw(slave_fd)
+    slave_path = os.ttyname(slave_fd)
+    real_serial = uart.Serial
+
+    def serial(*args, port=None, **kwargs):
+        return real_serial(*args, port=slave_path, **kwargs)
+
+    uart.Serial = serial
+    threading.Thread(target=feed_uart, args=(master_fd, baud, time.monotonic()), daemon=True).start()
+
+
+class CoinHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        now = int(time.time())
+        if self.path.startswith("/data/price"):
+            body = {"USD": 43210.5}
+        else:
+            candles = []
+            for i in range(25):
+                close = 43000 + 200 * np.sin(i / 3)
+                candles.append({"time": now - (24 - i) * 3600, "open": close - 50, "high": close + 120,
+                                "low": close - 150, "close": close, "volumeto": 1e6})
+            body = {"Response": "Success", "Data": {"Data": candles}}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def stub_http():
+    """Serve the coin API locally and send the app's requests there."""
+    import requests
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CoinHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    real_get = requests.get
+
+    def get(url, *args, **kwargs):
+        return real_get(url.replace(COIN_API, base), *args, **kwargs)
+
+    requests.get = get
+
+
+def wrap_tick(spec, ticks):
+    """Record (entered, returned) times of the function the app calls once per loop."""
+    module_name, class_name, name = spec
+    owner = __import__(module_name)
+    if class_name:
+        owner = getattr(owner, class_name)
+    real = getattr(owner, name)
+    clock = time.perf_counter
+
+    def tick(*args, **kwargs):
+        entered = clock()
+        try:
+            return real(*args, **kwargs)
+        finally:
+            ticks.append((entered, clock()))
+
+    setattr(owner, name, tick)
+    return lambda: setattr(owner, name, real)
+
+
+def run_child(app, seconds, result_path, trace=None, fast=False):
+    profile = PROFILES[app]
+    app_dir = APPS_DIR / app
+    os.environ["NANOKVM_FB"] = "anon"
+    sys.path.insert(0, str(app_dir))
+    os.chdir(app_dir)
+
+    result = {"app": app}
+    try:
+        import framebuffer
+
+        frames = []
+        framebuffer.frame_hooks.append(lambda display: frames.append(time.perf_counter()))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            devices = {}
+            replayer = None
+            if trace:
+                sys.path.append(str(SIMULATOR_DIR))
+                from input_trace import TraceReplayer
+
+                # The trace replaces the profile's devices and timeline
+                replayer = TraceReplayer(trace, realtime=not fast)
+                replayer.install()
+            elif profile.get("devices"):
+                import input as input_module
+
+                for name in profile["devices"]:
+                    devices[name] = FakeEvdev(os.path.join(tmp, name))
+                real_init = input_module.InputDevice.__init__
+
+                def init(self, device_path):
+                    device = devices.get(type(self).__name__)
+                    real_init(self, device.path if device else device_path)
+
+                input_module.InputDevice.__init__ = init
+
+            if "uart" in profile.get("externals", ()):
+                stub_uart(profile["baud"])
+            if "http" in profile.get("externals", ()):
+                stub_http()
+
+            ticks = []
+            unwrap = wrap_tick(profile["tick"], ticks) if "tick" in profile else None
+            start = time.monotonic()
+            start_perf = time.perf_counter()
+            if replayer:
+                replayer.start()
+            elif profile.get("timeline"):
+                threading.Thread(target=replay, args=(profile["timeline"], devices, start), daemon=True).start()
+
+            def stop(signum, frame):
+                raise KeyboardInterrupt
+            signal.signal(signal.SIGALRM, stop)
+            signal.setitimer(signal.ITIMER_REAL, seconds)
+
+            cpu_start = time.thread_time()
+            try:
+                runpy.run_path(str(app_dir / "main.py"), run_name="__main__")
+            except (KeyboardInterrupt, SystemExit):
+                pass
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                if unwrap:
+                    unwrap()
+            result["app_thread_cpu_s"] = time.thread_time() - cpu_start
+            result["wall_s"] = time.monotonic() - start
+            result["frames"] = frames
+            result["first_frame_s"] = frames[0] - start_perf if frames else None
+            result["ticks"] = ticks
+            if replayer:
+                done = replayer.finished_at
+                result["replay_done_s"] = round(done - start, 3) if done else None
+                replayer.close()
+            for device in devices.values():
+                device.close()
+    except ImportError as e:
+        result["skipped"] = f"missing module {e.name}"
+
+    with open(result_path, "w") as f:
+        json.dump(result, f)
+
+
+def distribution(values_s):
+    if len(values_s) == 0:
+        return None
+    ms = np.asarray(values_s) * 1000
+    return {
+        "count": int(len(ms)),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p90_ms": round(float(np.percentile(ms, 90)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def summarize(raw, rusage):
+    summary = {"app": raw["app"]}
+    if "skipped" in raw:
+        summary["skipped"] = raw["skipped"]
+        return summary
+
+    frames = np.asarray(raw["frames"])
+    ticks = np.asarray(raw["ticks"]).reshape(-1, 2)
+    wall = raw["wall_s"]
+    summary.update({
+        "wall_s": round(wall, 3),
+        "frames": int(len(frames)),
+        "fps": round(len(frames) / wall, 2) if wall else None,
+        # From starting main.py to the first presented frame
+        "first_frame_ms": round(raw["first_frame_s"] * 1000, 1) if raw["first_frame_s"] is not None else None,
+        "frame_interval": distribution(np.diff(frames)),
+        # Loop: start of one iteration to the next; work: the same minus the
+        # time spent inside the tick (the sleep or the input poll)
+        "loop": distribution(np.diff(ticks[:, 0])),
+        "work": distribution(ticks[1:, 0] - ticks[:-1, 1]),
+        "cpu_user_s": round(rusage.ru_utime, 3),
+        "cpu_system_s": round(rusage.ru_stime, 3),
+        "app_thread_cpu_s": round(raw["app_thread_cpu_s"], 3),
+        "cpu_percent": round(100 * (rusage.ru_utime + rusage.ru_stime) / wall, 1) if wall else None,
+        "peak_rss_kib": rusage.ru_maxrss,
+    })
+    if "replay_done_s" in raw:
+        # When the whole trace had been delivered (None: not within --seconds)
+        summary["replay_done_s"] = raw["replay_done_s"]
+    return summary
+
+
+def run_app(app, seconds, trace=None, fast=False):
+    with tempfile.NamedTemporaryFile(suffix=".json") as result:
+        command = [sys.executable, __file__, "--child", app, "--seconds", str(seconds), "--result", result.name]
+        if trace:
+            command += ["--trace", os.path.abspath(trace)] + (["--fast"] if fast else [])
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        # wait4 gives the child's own CPU time and peak RSS
+        _, status, rusage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        error = process.stderr.read().decode(errors="ignore")
+        process.stderr.close()
+        try:
+            with open(result.name, "r") as f:
+                raw = json.load(f)
+        except ValueError:
+            return {"app": app, "error": error.strip().splitlines()[-1:] or f"exit code {process.returncode}"}
+    return summarize(raw, rusage)
+
+
+def print_summary(summary):
+    if "skipped" in summary or "error" in summary:
+        print(f"{summary['app']:8} {summary.get('skipped') or summary.get('error')}")
+        return
+
+    def fmt(dist):
+        if not dist:
+            return "-"
+        return f"p50 {dist['p50_ms']:.2f} / p99 {dist['p99_ms']:.2f} / max {dist['max_ms']:.2f} ms"
+
+    print(f"{summary['app']:8} {summary['fps']:6.1f} fps  cpu {summary['cpu_percent']:5.1f}%  "
+          f"rss {summary['peak_rss_kib'] / 1024:6.1f} MiB")
+    first = summary["first_frame_ms"]
+    print(f"{'':8} first frame    {'-' if first is None else f'{first:.1f} ms'}")
+    print(f"{'':8} frame interval {fmt(summary['frame_interval'])}")
+    print(f"{'':8} loop           {fmt(summary['loop'])}")
+    print(f"{'':8} work           {fmt(summary['work'])}")
+    if "replay_done_s" in summary:
+        done = summary["replay_done_s"]
+        print(f"{'':8} trace          {'not finished' if done is None else f'delivered after {done:.2f} s'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark whole apps with scripted input")
+    parser.add_argument("apps", nargs="*", help=f"apps to run (default: {' '.join(PROFILES)})")
+    parser.add_argument("--seconds", type=float, default=5.0, help="how long each app runs")
+    parser.add_argument("--trace", help="replay this input trace instead of the profile's timeline")
+    parser.add_argument("--fast", action="store_true", help="replay the trace as fast as the app reads it")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.seconds, args.result, args.trace, args.fast)
+        return
+
+    results = []
+    for app in args.apps or PROFILES:
+        if app not in PROFILES:
+            sys.exit(f"No profile for app: {app}")
+        summary = run_app(app, args.seconds, args.trace, args.fast)
+        print_summary(summary)
+        results.append(summary)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"seconds": args.seconds, "results": results}, f, indent=2)
+        print(f"\nWrote {len(results)} result(s) to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
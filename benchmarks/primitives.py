@@ -0,0 +1,233 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+
+import numpy as np
+import PIL
+from PIL import Image, ImageDraw
+
+# Micro-benchmarks for the drawing primitives in common/framebuffer.py. They
+# run against a file-backed framebuffer (see simulator/readme.md), so they
+# measure the Python/numpy side of the display stack, not the panel driver.
+
+
+def get_path():
+    from pathlib import Path
+
+    curr_dir = Path(__file__).resolve().parent
+    parent_dir = curr_dir.parent
+    return (parent_dir, parent_dir / "common")
+
+
+(ROOT_DIR, COMMON_DIR) = get_path()
+sys.path.insert(0, str(COMMON_DIR))
+
+import framebuffer  # noqa: E402
+
+ROTATIONS = (0, 90, 180, 270)
+BPPS = (16, 24, 32)
+SHORT_TEXT = "12:34"
+LONG_TEXT = "The quick brown fox jumps over the lazy dog 0123456789"
+# Allocation tracing is slow, so it only looks at a sample of calls
+ALLOC_SAMPLES = 20
+
+
+def measure(op, iterations, warmup):
+    for _ in range(warmup):
+        op()
+
+    samples = np.empty(iterations, dtype=np.int64)
+    clock = time.perf_counter_ns
+    for i in range(iterations):
+        start = clock()
+        op()
+        samples[i] = clock() - start
+
+    # Peak bytes allocated while one call runs (numpy buffers included)
+    tracemalloc.start()
+    peaks = []
+    for _ in range(min(iterations, ALLOC_SAMPLES)):
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        op()
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    total_s = samples.sum() / 1e9
+    return {
+        "iterations": iterations,
+        "ops_per_s": round(iterations / total_s, 1) if total_s else None,
+        "mean_us": round(samples.mean() / 1e3, 2),
+        "p50_us": round(np.percentile(samples, 50) / 1e3, 2),
+        "p99_us": round(np.percentile(samples, 99) / 1e3, 2),
+        "alloc_peak_bytes": int(np.median(peaks)),
+    }
+
+
+def framebuffer_cases(fb):
+    """(name, op) pairs for one opened Framebuffer; draw calls skip the swap."""
+    white = (255, 255, 255)
+    step = [0]
+
+    def moving():
+        # Vary the position so damage and clipping are not always identical
+        step[0] = (step[0] + 7) % 97
+        return step[0]
+
+    def draw_rect():
+        offset = moving()
+        fb.draw_rect(offset, offset // 2, 40, 30, (255, 0, 0), auto_swap=False)
+
+    def draw_pixel():
+        offset = moving()
+        fb.draw_pixel(offset, offset // 2, white)
+
+    def swap_damage():
+        offset = moving()
+        fb.mark_damaged(offset, offset // 2, 40, 30)
+        fb.swap_buffer()
+
+    return [
+        ("fill_screen", lambda: fb.fill_screen((0, 0, 255), auto_swap=False)),
+        ("draw_rect", draw_rect),
+        ("draw_text_short", lambda: fb.draw_text(10, 10, SHORT_TEXT, white, auto_swap=False)),
+        ("draw_text_long", lambda: fb.draw_text(0, 40, LONG_TEXT, white, auto_swap=False)),
+        ("draw_pixel", draw_pixel),
+        ("swap_buffer_full", lambda: fb.swap_buffer(full=True)),
+        ("swap_buffer_damage", swap_damage),
+    ]
+
+
+def display_cases(path):
+    """(name, display, op) triples for RGB565Display._display_image."""
+    rng = np.random.default_rng(0)
+    frames = [Image.fromarray(rng.integers(0, 256, (172, 320, 3), dtype=np.uint8)) for _ in range(2)]
+    # A mostly static frame with one small moving box, like the clock apps
+    still = Image.new("RGB", (320, 172))
+    still_draw = ImageDraw.Draw(still)
+    box = [0]
+
+    cases = []
+    for diff in (True, False):
+        display = framebuffer.RGB565Display(path, diff=diff)
+        suffix = "" if diff else "_nodiff"
+        flip = [0]
+
+        def changing(display=display, flip=flip):
+            flip[0] ^= 1
+            display._display_image(frames[flip[0]])
+
+        def small_change(display=display):
+            still_draw.rectangle((0, 0, 319, 171), fill=0)
+            box[0] = (box[0] + 5) % 280
+            still_draw.rectangle((box[0], 60, box[0] + 29, 89), fill=(255, 255, 255))
+            display._display_image(still)
+
+        cases.append(("display_image_full_change" + suffix, display, changing))
+        cases.append(("display_image_small_change" + suffix, display, small_change))
+    return cases
+
+
+def git_revision():
+    try:
+        rev = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                                      stderr=subprocess.DEVNULL, text=True).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "--", "common"], cwd=ROOT_DIR,
+                                stderr=subprocess.DEVNULL) != 0
+        return rev + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(iterations, warmup, only):
+    results = []
+
+    def record(name, bpp, rotation, op):
+        if only and only not in name:
+            return
+        stats = measure(op, iterations, warmup)
+        results.append({"case": name, "bpp": bpp, "rotation": rotation, **stats})
+        print(f"{name:34} {bpp:>3} {str(rotation):>4} {stats['ops_per_s']:>12.1f} "
+              f"{stats['p50_us']:>10.2f} {stats['p99_us']:>10.2f} {stats['alloc_peak_bytes']:>10}")
+
+    print(f"{'case':34} {'bpp':>3} {'rot':>4} {'ops/s':>12} {'p50 us':>10} {'p99 us':>10} {'alloc B':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fb.bin")
+        default_bpp = framebuffer.PANEL_BPP
+        try:
+            for bpp in BPPS:
+                # The file backend takes its pixel format from PANEL_BPP
+                framebuffer.PANEL_BPP = bpp
+                for rotation in ROTATIONS:
+                    fb = framebuffer.Framebuffer(path, rotation=rotation)
+                    for name, op in framebuffer_cases(fb):
+                        record(name, bpp, rotation, op)
+                    fb.close()
+        finally:
+            framebuffer.PANEL_BPP = default_bpp
+
+        # RGB565Display is 16 bpp only and always draws in the landscape view
+        displays = set()
+        for name, display, op in display_cases(path):
+            record(name, 16, None, op)
+            displays.add(display)
+        for display in displays:
+            display.close()
+
+    return results
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    old = {(r["case"], r["bpp"], r["rotation"]): r for r in baseline["results"]}
+
+    print(f"\nCompared with {baseline_path} ({baseline['meta'].get('git')}):")
+    for r in results:
+        before = old.get((r["case"], r["bpp"], r["rotation"]))
+        if not before or not before["p50_us"]:
+            continue
+        change = (r["p50_us"] / before["p50_us"] - 1) * 100
+        print(f"{r['case']:34} {r['bpp']:>3} {str(r['rotation']):>4} "
+              f"p50 {before['p50_us']:>9.2f} -> {r['p50_us']:>9.2f} us ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the framebuffer drawing primitives")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="JSON file from an earlier run to compare against")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--only", help="run only cases whose name contains this text")
+    args = parser.parse_args()
+
+    results = run(args.iterations, args.warmup, args.only)
+    report = {
+        "meta": {
+            "git": git_revision(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pillow": PIL.__version__,
+            "machine": platform.machine(),
+            "iterations": args.iterations,
+        },
+        "results": results,
+    }
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {len(results)} result(s) to {args.json}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
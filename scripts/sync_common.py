@@ -0,0 +1,59 @@
+import os
+import re
+import sys
+import filecmp
+import shutil
+
+# Apps are downloaded folder by folder, so shared modules are vendored: the
+# source of truth lives in common/ and this script copies it into every app
+# that imports it. Run with --check to only report stale copies.
+
+
+def get_path():
+    from pathlib import Path
+
+    curr_dir = Path(__file__).resolve().parent
+    parent_dir = curr_dir.parent
+    return (parent_dir / "common", parent_dir / "apps")
+
+
+(COMMON_DIR, APPS_DIR) = get_path()
+
+
+def imports_module(folder_path, module, shared):
+    pattern = re.compile(rf"^\s*(from\s+{module}\s+import|import\s+{module}\b)", re.M)
+    for name in os.listdir(folder_path):
+        if not name.endswith(".py") or name in shared:
+            continue
+        with open(os.path.join(folder_path, name), "r", encoding="utf-8") as f:
+            if pattern.search(f.read()):
+                return True
+    return False
+
+
+check_only = "--check" in sys.argv[1:]
+shared = sorted(f for f in os.listdir(COMMON_DIR) if f.endswith(".py"))
+stale = []
+
+for folder_name in sorted(os.listdir(APPS_DIR)):
+    folder_path = os.path.join(APPS_DIR, folder_name)
+    if not os.path.isdir(folder_path):
+        continue
+
+    for name in shared:
+        if not imports_module(folder_path, name[:-3], shared):
+            continue
+        src = os.path.join(COMMON_DIR, name)
+        dst = os.path.join(folder_path, name)
+        if os.path.isfile(dst) and filecmp.cmp(src, dst, shallow=False):
+            continue
+        stale.append(f"{folder_name}/{name}")
+        if not check_only:
+            shutil.copyfile(src, dst)
+
+if check_only:
+    for path in stale:
+        print(f"Out of date: apps/{path}")
+    sys.exit(1 if stale else 0)
+
+print(f"Updated {len(stale)} file(s): {', '.join(stale) or 'none'}")
@@ -0,0 +1,240 @@
+import os
+import sys
+import time
+import struct
+import select
+import argparse
+import tempfile
+import threading
+
+# Records the raw input_event streams of the touch screen, keys and rotary
+# encoder into a trace file, and replays a trace into an app through FIFOs
+# that stand in for /dev/input/eventN.
+#
+# Trace file layout (little endian):
+#   magic  b'NKVMINP1'
+#   count  u8, then per device: u8 length + sysfs name (e.g. b'hyn_ts')
+#   events (device u8, delta_us u32, type u16, code u16, value i32), where
+#          delta_us is the time since the previous event in the trace
+
+
+def get_path():
+    from pathlib import Path
+
+    curr_dir = Path(__file__).resolve().parent
+    return curr_dir.parent / "common"
+
+
+COMMON_DIR = get_path()
+
+MAGIC = b'NKVMINP1'
+RECORD = struct.Struct('<BIHHi')
+EVENT_FORMAT = 'llHHi'
+EVENT_SIZE = struct.calcsize(EVENT_FORMAT)
+EV_SYN = 0x00
+DEVICE_NAMES = ('hyn_ts', 'gpio_keys', 'rotary@0')
+
+
+class TraceWriter:
+    def __init__(self, path, names):
+        self.names = list(names)
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC + bytes([len(self.names)]))
+        for name in self.names:
+            encoded = name.encode()
+            self._file.write(bytes([len(encoded)]) + encoded)
+        self._last = None
+        self.count = 0
+
+    def write(self, device, t, type, code, value):
+        """device is an index into names, t a time in seconds on any clock."""
+        delta = 0 if self._last is None else max(0, round((t - self._last) * 1e6))
+        self._last = t
+        self._file.write(RECORD.pack(device, min(delta, 0xFFFFFFFF), type, code, value))
+        self.count += 1
+
+    def close(self):
+        self._file.close()
+
+
+def read_trace(path):
+    """Returns (names, [(t, device, type, code, value)]) with t in seconds from the first event."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not an input trace")
+    offset = len(MAGIC) + 1
+    names = []
+    for _ in range(data[len(MAGIC)]):
+        length = data[offset]
+        names.append(data[offset + 1:offset + 1 + length].decode())
+        offset += 1 + length
+
+    events = []
+    t_us = 0
+    size = len(data) - (len(data) - offset) % RECORD.size
+    for device, delta, type, code, value in RECORD.iter_unpack(memoryview(data)[offset:size]):
+        t_us += delta
+        events.append((t_us / 1e6, device, type, code, value))
+    return names, events
+
+
+def record(output, names=DEVICE_NAMES, seconds=None):
+    """Copy the events of the named devices into a trace until Ctrl+C or the time runs out."""
+    sys.path.insert(0, str(COMMON_DIR))
+    from input import get_discovery
+
+    fds = {}
+    found = []
+    for name in names:
+        path = get_discovery().find(name)
+        if not path:
+            print(f"Skipping {name}: not found")
+            continue
+        fds[os.open(path, os.O_RDONLY | os.O_NONBLOCK)] = len(found)
+        found.append(name)
+    if not fds:
+        sys.exit("No input devices to record")
+
+    writer = TraceWriter(output, found)
+    epoll = select.epoll()
+    for fd in fds:
+        epoll.register(fd, select.EPOLLIN)
+    end = None if seconds is None else time.monotonic() + seconds
+    print(f"Recording {', '.join(found)} to {output}, Ctrl+C to stop")
+    try:
+        while end is None or time.monotonic() < end:
+            timeout = -1 if end is None else max(0, end - time.monotonic())
+            for fd, _ in epoll.poll(timeout):
+                try:
+                    data = os.read(fd, 64 * EVENT_SIZE)
+                except BlockingIOError:
+                    continue
+                size = len(data) - len(data) % EVENT_SIZE
+                # Kernel timestamps, so the trace keeps the real event spacing
+                for sec, usec, type, code, value in struct.iter_unpack(EVENT_FORMAT, data[:size]):
+                    writer.write(fds[fd], sec + usec / 1e6, type, code, value)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        epoll.close()
+        for fd in fds:
+            os.close(fd)
+        writer.close()
+    return writer.count
+
+
+class TraceReplayer:
+    """Replays a trace into the input devices an app opens by name.
+
+    install() points input.get_discovery() at FIFOs named like the traced
+    devices, so TouchScreen, GpioKeys, RotaryEncoder and InputHub pick them
+    up unchanged; call it after the app folder is on sys.path. start() then
+    feeds the events from a thread, either with the recorded timing
+    (realtime) or as fast as the app reads them. In both modes the event
+    timestamps keep the recorded spacing, so gestures decode the same way.
+    """
+
+    def __init__(self, trace, realtime=True):
+        self.names, self.events = read_trace(trace)
+        self.realtime = realtime
+        self.done = threading.Event()
+        self.on_done = None
+        self._stop = threading.Event()
+        # time.monotonic() when the last event was written
+        self.finished_at = None
+        self._tmp = None
+        self._fds = []
+        self._thread = None
+
+    def install(self):
+        import input
+
+        self._tmp = tempfile.TemporaryDirectory()
+        sys_dir = os.path.join(self._tmp.name, 'sys')
+        dev_dir = os.path.join(self._tmp.name, 'dev')
+        os.makedirs(dev_dir)
+        for i, name in enumerate(self.names):
+            os.makedirs(os.path.join(sys_dir, f'event{i}', 'device'))
+            with open(os.path.join(sys_dir, f'event{i}', 'device', 'name'), 'w') as f:
+                f.write(name + '\n')
+            path = os.path.join(dev_dir, f'event{i}')
+            os.mkfifo(path)
+            # Held read-write so the app's open() never waits for a writer;
+            # blocking writes hold the fast replay back while the pipe is full
+            self._fds.append(os.open(path, os.O_RDWR))
+        input._discovery = input.InputDiscovery(sys_dir, dev_dir)
+
+    def _feed(self):
+        # FIFOs cannot set EVIOCSCLOCKID, so the devices compare with time.time()
+        start_wall = time.time()
+        start = time.monotonic()
+        pending = {}
+        fds = list(self._fds)
+        try:
+            for t, device, type, code, value in self.events:
+                if self.realtime:
+                    delay = start + t - time.monotonic()
+                    if delay > 0 and self._stop.wait(delay):
+                        return
+                elif self._stop.is_set():
+                    return
+                stamp = start_wall + t
+                packet = struct.pack(EVENT_FORMAT, int(stamp), int((stamp % 1) * 1e6), type, code, value)
+                # Write whole reports (up to EV_SYN) at once, like evdev delivers them
+                pending[device] = pending.get(device, b'') + packet
+                if type == EV_SYN:
+                    os.write(fds[device], pending.pop(device))
+            for device, data in pending.items():
+                os.write(fds[device], data)
+        except OSError:
+            # The FIFOs were closed under us: the app is gone
+            return
+        self.finished_at = time.monotonic()
+        self.done.set()
+        if self.on_done:
+            self.on_done()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._feed, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread:
+            # A fast replay can be blocked on a full pipe the app no longer reads
+            self._thread.join(0.5)
+            self._thread = None
+        for fd in self._fds:
+            os.close(fd)
+        self._fds = []
+        if self._tmp:
+            self._tmp.cleanup()
+            self._tmp = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record or inspect input event traces")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rec = commands.add_parser("record", help="record the input devices (run on the NanoKVM)")
+    rec.add_argument("output")
+    rec.add_argument("--seconds", type=float, help="stop after this many seconds")
+    rec.add_argument("--devices", nargs="+", default=list(DEVICE_NAMES), help="sysfs device names")
+    info = commands.add_parser("info", help="summarize a trace")
+    info.add_argument("trace")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        count = record(args.output, args.devices, args.seconds)
+        print(f"\nRecorded {count} event(s) to {args.output}")
+    else:
+        names, events = read_trace(args.trace)
+        duration = events[-1][0] if events else 0.0
+        print(f"{len(events)} event(s) over {duration:.2f} s")
+        for i, name in enumerate(names):
+            reports = sum(1 for e in events if e[1] == i and e[2] == EV_SYN)
+            print(f"  {name:12} {sum(1 for e in events if e[1] == i):8} events {reports:8} reports")
+
+
+if __name__ == "__main__":
+    main()
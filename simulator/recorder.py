@@ -0,0 +1,58 @@
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+# Records the frames an app presents. Pass capture to framebuffer.frame_hooks;
+# both Framebuffer and RGB565Display call it after every presented frame.
+
+
+class FrameRecorder:
+    ANIMATED = ('.gif', '.webp', '.png')
+
+    def __init__(self, output, skip_unchanged=True):
+        """output is a directory for a PNG sequence, or a .gif/.webp/.png animation."""
+        self.output = output
+        self.skip_unchanged = skip_unchanged
+        self.animated = os.path.splitext(output)[1].lower() in self.ANIMATED
+        self.frames = []
+        self.times = []
+        self._last = None
+        self._start = None
+        if not self.animated:
+            os.makedirs(output, exist_ok=True)
+            self._index = open(os.path.join(output, 'frames.csv'), 'w')
+            self._index.write('file,t_ms\n')
+
+    def capture(self, display):
+        now = time.monotonic()
+        frame = display.snapshot()
+        if self.skip_unchanged and self._last is not None and np.array_equal(frame, self._last):
+            return
+        if self._start is None:
+            self._start = now
+        self._last = frame
+        t_ms = (now - self._start) * 1000
+        self.times.append(t_ms)
+
+        if self.animated:
+            self.frames.append(Image.fromarray(frame))
+        else:
+            name = f'frame_{len(self.times) - 1:05d}.png'
+            Image.fromarray(frame).save(os.path.join(self.output, name))
+            self._index.write(f'{name},{t_ms:.1f}\n')
+
+    def save(self):
+        """Finish the recording; returns the number of frames."""
+        if not self.animated:
+            self._index.close()
+            return len(self.times)
+        if not self.frames:
+            return 0
+        # Each frame stays up until the next one arrives
+        durations = [max(1, round(b - a)) for a, b in zip(self.times, self.times[1:])]
+        durations.append(durations[-1] if durations else 100)
+        self.frames[0].save(self.output, save_all=True, append_images=self.frames[1:],
+                            duration=durations, loop=0)
+        return len(self.frames)
@@ -0,0 +1,82 @@
+import os
+import sys
+import runpy
+import signal
+import argparse
+
+from recorder import FrameRecorder
+from input_trace import TraceReplayer
+
+# Run an app on a plain Linux box: the framebuffer is replaced by a file or
+# anonymous memory (NANOKVM_FB), presented frames can be recorded and a
+# recorded input trace can be replayed into the app.
+
+
+def get_path():
+    from pathlib import Path
+
+    curr_dir = Path(__file__).resolve().parent
+    return curr_dir.parent / "apps"
+
+
+APPS_DIR = get_path()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a NanoKVM app without the device")
+    parser.add_argument("app", help="folder name under apps/")
+    parser.add_argument("--fb", default="anon",
+                        help="file backing the framebuffer, or 'anon' (default)")
+    parser.add_argument("--record", help="output directory (PNG sequence) or .gif/.webp/.png")
+    parser.add_argument("--seconds", type=float, help="stop the app after this many seconds")
+    parser.add_argument("--replay", help="input trace to feed the app (see input_trace.py)")
+    parser.add_argument("--fast", action="store_true", help="replay as fast as the app reads input")
+    args = parser.parse_args()
+
+    app_dir = APPS_DIR / args.app
+    if not (app_dir / "main.py").is_file():
+        sys.exit(f"No such app: {args.app}")
+
+    # Resolve paths before moving into the app folder
+    os.environ["NANOKVM_FB"] = os.path.abspath(args.fb) if args.fb != "anon" else "anon"
+    record = os.path.abspath(args.record) if args.record else None
+    replayer = TraceReplayer(args.replay, realtime=not args.fast) if args.replay else None
+    sys.path.insert(0, str(app_dir))
+    os.chdir(app_dir)
+    import framebuffer
+
+    recorder = None
+    if record:
+        recorder = FrameRecorder(record)
+        framebuffer.frame_hooks.append(recorder.capture)
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGALRM, stop)
+    if args.seconds:
+        signal.setitimer(signal.ITIMER_REAL, args.seconds)
+
+    if replayer:
+        try:
+            replayer.install()
+        except ImportError:
+            sys.exit(f"{args.app} does not use input.py, nothing to replay into")
+        if not args.seconds:
+            # Give the app a moment to draw the last input, then stop it
+            replayer.on_done = lambda: signal.setitimer(signal.ITIMER_REAL, 1.0)
+        replayer.start()
+
+    try:
+        runpy.run_path(str(app_dir / "main.py"), run_name="__main__")
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        if replayer:
+            replayer.close()
+        if recorder:
+            print(f"\nRecorded {recorder.save()} frame(s) to {recorder.output}")
+
+
+if __name__ == "__main__":
+    main()
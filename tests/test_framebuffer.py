@@ -0,0 +1,31 @@
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Headless framebuffer in anonymous memory, see simulator/readme.md
+os.environ["NANOKVM_FB"] = "anon"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "common"))
+
+from framebuffer import RGB565Display  # noqa: E402
+
+
+def test_display_image_accepts_pil_image():
+    display = RGB565Display()
+    frame = np.zeros((172, 320, 3), dtype=np.uint8)
+    frame[10, 20] = (255, 128, 8)
+    display._display_image(Image.fromarray(frame))
+    assert tuple(display.snapshot()[10, 20]) == (255, 130, 8)
+    display.close()
+
+
+def test_display_image_accepts_array():
+    display = RGB565Display()
+    frame = np.zeros((172, 320, 3), dtype=np.uint8)
+    frame[10, 20] = (8, 252, 248)
+    display._display_image(frame)
+    assert tuple(display.snapshot()[10, 20]) == (8, 255, 255)
+    assert tuple(display.snapshot()[0, 0]) == (0, 0, 0)
+    display.close()
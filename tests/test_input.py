@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+import struct
+import asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "common"))
+
+from input import AsyncInput, GpioKeys  # noqa: E402
+
+
+def key_report(code, value):
+    now = time.time()
+    sec, usec = int(now), int(now % 1 * 1e6)
+    return struct.pack('llHHi', sec, usec, 1, code, value) + struct.pack('llHHi', sec, usec, 0, 0, 0)
+
+
+def test_async_input_reports_unplugged_device(tmp_path):
+    # A FIFO stands in for the evdev node: once the writer side is closed it
+    # reports POLLHUP, like a node whose device was removed
+    path = str(tmp_path / "event0")
+    os.mkfifo(path)
+    writer = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+    keys = GpioKeys(device_path=path)
+    assert keys.open()
+
+    async def main():
+        async with AsyncInput(keys, hotplug=False) as events:
+            os.write(writer, key_report(28, 1))
+            source, event = await asyncio.wait_for(events.read_event(), 1)
+            assert source is keys and event[:2] == ('key_press', 'ENTER')
+
+            os.close(writer)
+            source, event = await asyncio.wait_for(events.read_event(), 1)
+            assert source is keys
+            assert event == ('device_removed', GpioKeys.DEVICE_NAME, path)
+            assert not events._readers
+            assert keys.fileno() is None
+
+            # The reader is gone, so nothing else is queued
+            await asyncio.sleep(0.1)
+            assert events._queue.empty()
+
+    asyncio.run(main())